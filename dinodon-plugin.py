@@ -9,8 +9,13 @@ def check_is_with_singleton(physical_line, line_number):
         offset = match_obj.span()[0]
         return (0, 12, (line_number, offset), "Use equal with singleton")
 
-plugins = {
-    "physical_line": [check_is_with_singleton],
-    "logical_line": [],
-    "ast": []
-}
\ No newline at end of file
+check_is_with_singleton.regex = IS_WITH_SINGLETON_REGEX
+check_is_with_singleton.required_regex = re.compile("==|!=")
+
+manifest = {
+    "name": "singleton",
+    "version": "0.1.0",
+    "cacheable": True,
+    "rules": [
+        {"id": "check_is_with_singleton", "phase": "physical_line"}]
+}
@@ -0,0 +1,307 @@
+# Benchmark
+#
+# `bench` lints synthetic corpora with one phase enabled at a time and
+# reports lines/sec and files/sec per corpus and phase. The corpora are
+# generated from a fixed seed so numbers stay comparable between runs; each
+# measurement is the best of several repeats.
+#
+# The startup corpus measures what a hook pays per file in new processes:
+# `import` is the import of dinodon alone, `first_violation` the time from
+# launching `python3 dinodon.py run` on a small file to its first output and
+# `first_violation_module` the same through `python3 -m dinodon run`.
+
+import sys
+import os
+import time
+import functools
+
+from dinodon_engine import VERSION, ALL_CHECKS, Log, iter_violations, \
+    lint_source, _add_plugins
+from dinodon_report import _start_report, _add_report_file, _finish_report
+
+BENCH_BASELINE = ".dinodon_bench.json"
+BENCH_THRESHOLD = 0.1
+BENCH_PHASES = ["physical_line", "logical_line", "ast", "report"]
+BENCH_STARTUP_FILE_SIZE = 10
+
+
+def _bench_function(random, index, depth=1):
+    name = "function_%d" % index
+    lines = ["def %s(value, items):" % name, "    result = []"]
+    indent = "    "
+    for level in range(depth):
+        lines.append("%sif value > %d:" % (indent, level))
+        indent += "    "
+    lines += [
+        "%sfor item in items:" % indent,
+        "%s    result.append(item * %d)" % (indent, random.randint(2, 9)),
+        "%sresult = sorted(result, key=str)" % indent,
+        "    return {\"name\": \"%s\", \"result\": result}" % name,
+        "", ""]
+    return lines
+
+
+def _bench_class(random, index):
+    lines = ["class Model%s:" % chr(ord("A") + index % 26)]
+    for method in range(random.randint(2, 5)):
+        lines += [
+            "    def method_%d(self, value):" % method,
+            "        return [value, self, (value, %d)]" % method,
+            ""]
+    return lines + ["", ""]
+
+
+def _bench_module(random, size, depth=1):
+    lines = ["import os", "import sys", "", ""]
+    for index in range(size):
+        if index % 4 == 3:
+            lines += _bench_class(random, index)
+        else:
+            lines += _bench_function(random, index, depth)
+    return "\n".join(lines)
+
+
+def _bench_directives(random, size):
+    rule_names = [check.__name__ for lint_type in sorted(ALL_CHECKS) \
+        for check in ALL_CHECKS[lint_type]]
+    lines = []
+    for index in range(size):
+        rule_name = random.choice(rule_names)
+        lines += [
+            "# dinodon:disable %s" % rule_name,
+            "value_%d = map(lambda x: x, [%d])" % (index, index),
+            "# dinodon:enable %s" % rule_name]
+    return "\n".join(lines) + "\n"
+
+
+def _bench_violations(random, size):
+    lines = []
+    for index in range(size):
+        lines += [
+            "import os, sys",
+            "camelValue = map(lambda x: x * 2, [ %d ])" % index,
+            "if camelValue:",
+            "\tother_value = 1" + " " * random.randint(1, 3),
+            "value = \"%s\"" % ("x" * random.randint(80, 100)),
+            "def badName():",
+            "    return 1"]
+    return "\n".join(lines) + "\n"
+
+
+# Returns [(corpus name, [source])]
+def _bench_corpora(scale):
+    import random
+
+    random = random.Random(0)
+    return [
+        ("huge_file", [_bench_module(random, int(2000 * scale))]),
+        ("many_small", [_bench_module(random, 5) \
+            for index in range(int(400 * scale))]),
+        ("deep_ast", [_bench_module(random, int(200 * scale), depth=24)]),
+        ("directive_heavy", [_bench_directives(random, int(3000 * scale))]),
+        ("violation_heavy", [_bench_violations(random, int(1000 * scale))])]
+
+
+def _bench_time(function, repeat):
+    best_time = None
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        elapsed_time = time.perf_counter() - start_time
+        if best_time is None or elapsed_time < best_time:
+            best_time = elapsed_time
+    return best_time
+
+
+def _bench_lint(sources, rules):
+    for code in sources:
+        for result in iter_violations(code, rules):
+            pass
+
+
+def _bench_report(sources, all_results, report_path):
+    report = _start_report(report_path)
+    for index, code in enumerate(sources):
+        _add_report_file(report, "bench_%d.py" % index, all_results[index], \
+            code.split("\n"))
+    _finish_report(report)
+
+
+# Seconds until the command prints its first line, or exits without output
+def _bench_launch(command, environment):
+    import subprocess
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, \
+        stderr=subprocess.DEVNULL, env=environment)
+    process.stdout.readline()
+    elapsed_time = time.perf_counter() - start_time
+    process.stdout.close()
+    process.wait()
+    return elapsed_time
+
+
+# Seconds of the import, as measured by the new interpreter itself
+def _bench_import(module_name, environment):
+    import subprocess
+
+    output = subprocess.run([sys.executable, "-c", "import time; " \
+        "start_time = time.perf_counter(); import %s; " \
+        "print(time.perf_counter() - start_time)" % module_name], \
+        stdout=subprocess.PIPE, env=environment, check=True).stdout
+    return float(output)
+
+
+def _bench_startup(lint_file, line_count, plugin_options, repeat):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([directory] \
+        + ([environment["PYTHONPATH"]] if environment.get("PYTHONPATH") \
+        else []))
+    arguments = ["run", "--no-cache"] + plugin_options + [lint_file]
+    launches = {
+        "import": functools.partial(_bench_import, "dinodon", environment),
+        "first_violation": functools.partial(_bench_launch, [sys.executable, \
+            os.path.join(directory, "dinodon.py")] + arguments, environment),
+        "first_violation_module": functools.partial(_bench_launch, \
+            [sys.executable, "-m", "dinodon"] + arguments, environment)}
+
+    measurements = {}
+    for phase in ["import", "first_violation", "first_violation_module"]:
+        # the first launch may compile the module
+        launches[phase]()
+        elapsed_time = max(min([launches[phase]() \
+            for index in range(repeat)]), 1e-9)
+        measurements["startup/%s" % phase] = {
+            "seconds": elapsed_time,
+            "lines_per_second": line_count / elapsed_time,
+            "files_per_second": 1 / elapsed_time}
+    return measurements
+
+
+def _run_benchmark(scale, repeat, plugin_options=()):
+    import random
+    import shutil
+    import tempfile
+
+    measurements = {}
+    report_path = os.path.join(tempfile.mkdtemp(), "report.js")
+    for corpus_name, sources in _bench_corpora(scale):
+        line_count = sum([code.count("\n") + 1 for code in sources])
+        all_results = [lint_source(code) for code in sources]
+
+        for phase in BENCH_PHASES:
+            if phase == "report":
+                elapsed_time = _bench_time(functools.partial(_bench_report, \
+                    sources, all_results, report_path), repeat)
+            else:
+                rules = {phase: ALL_CHECKS[phase]}
+                elapsed_time = _bench_time(functools.partial(_bench_lint, \
+                    sources, rules), repeat)
+
+            elapsed_time = max(elapsed_time, 1e-9)
+            measurements["%s/%s" % (corpus_name, phase)] = {
+                "seconds": elapsed_time,
+                "lines_per_second": line_count / elapsed_time,
+                "files_per_second": len(sources) / elapsed_time}
+
+    startup_code = _bench_violations(random.Random(0), BENCH_STARTUP_FILE_SIZE)
+    startup_file = os.path.join(os.path.dirname(report_path), "startup.py")
+    with open(startup_file, 'w') as f:
+        f.write(startup_code)
+    measurements.update(_bench_startup(startup_file, \
+        startup_code.count("\n") + 1, list(plugin_options), repeat))
+
+    shutil.rmtree(os.path.dirname(report_path), ignore_errors=True)
+    return measurements
+
+
+# `--threshold=0.1` applies to every phase, `--threshold=ast:0.25` only to
+# one of them
+def _bench_thresholds(options):
+    thresholds = {}
+    for option in options:
+        if option.startswith("--threshold="):
+            value = option.split("=", 1)[1]
+            if ":" in value:
+                phase, value = value.split(":", 1)
+                thresholds[phase] = float(value)
+            else:
+                thresholds[""] = float(value)
+    return thresholds
+
+
+def _compare_benchmark(measurements, baseline, thresholds):
+    regressions = []
+    for key in sorted(measurements):
+        if key not in baseline:
+            continue
+        phase = key.split("/")[1]
+        threshold = thresholds.get(phase, thresholds.get("", BENCH_THRESHOLD))
+        current_speed = measurements[key]["lines_per_second"]
+        baseline_speed = baseline[key]["lines_per_second"]
+        if current_speed < baseline_speed * (1 - threshold):
+            regressions.append((key, current_speed / baseline_speed - 1))
+    return regressions
+
+
+def _log_benchmark(measurements, baseline):
+    Log.info("%-32s %10s %14s %12s %8s" % ("corpus/phase", "seconds", \
+        "lines/sec", "files/sec", "change"))
+    for key in sorted(measurements):
+        measurement = measurements[key]
+        change = ""
+        if key in baseline:
+            change = "%+.1f%%" % ((measurement["lines_per_second"] \
+                / baseline[key]["lines_per_second"] - 1) * 100)
+        Log.info("%-32s %10.4f %14.0f %12.1f %8s" % (key, \
+            measurement["seconds"], measurement["lines_per_second"], \
+            measurement["files_per_second"], change))
+
+
+def _bench(options):
+    import json
+
+    baseline_path = BENCH_BASELINE
+    save_baseline = False
+    scale = 1.0
+    repeat = 3
+    plugin_options = []
+
+    for option in options:
+        if option.startswith("--plugins="):
+            if not _add_plugins(option):
+                return False
+            plugin_options.append(option)
+        if option.startswith("--baseline="):
+            baseline_path = option.split("=", 1)[1]
+        if option == "--save-baseline":
+            save_baseline = True
+        if option.startswith("--scale="):
+            scale = float(option.split("=")[1])
+        if option.startswith("--repeat="):
+            repeat = int(option.split("=")[1])
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)["measurements"]
+
+    measurements = _run_benchmark(scale, repeat, plugin_options)
+    _log_benchmark(measurements, baseline)
+
+    if save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump({
+                "version": VERSION,
+                "python": sys.version.split()[0],
+                "scale": scale,
+                "measurements": measurements}, f, indent=2, sort_keys=True)
+        Log.info("Baseline saved to %s" % baseline_path)
+        return True
+
+    regressions = _compare_benchmark(measurements, baseline, \
+        _bench_thresholds(options))
+    for key, change in regressions:
+        Log.error("%s regressed by %.1f%%" % (key, -change * 100))
+    return len(regressions) == 0
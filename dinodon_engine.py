@@ -0,0 +1,2564 @@
+import re
+from enum import Enum
+import ast
+import io
+import tokenize
+import heapq
+import itertools
+
+VERSION = "0.1.0"
+
+# Regex types
+
+INDENT_REGEX = re.compile('(\t+)')
+EXTRANEOUS_WHITESPACE_REGEX = re.compile('[\[({] | [\]});:]')
+CLASS_NAMING = re.compile("^([A-Z][a-z]*)+$")
+# for function and variable
+COMMON_NAMING = re.compile("^_*([A-Z]+(_[A-Z]+)*|[a-z]+(_[a-z]+)*)$")
+DEFINITION_REGEX = re.compile(r"^(async\s+def|def|class)\b")
+DIRECTIVE_REGEX = re.compile(r"^[^\S\n]*# dinodon:(disable|enable)(.*)$", re.M)
+
+# Violation
+
+class ViolationLevel(Enum):
+    WARNING = 0
+    ERROR = 1
+
+
+class ViolationType(Enum):
+    HAS_TAB = 1
+    BLANK_LINE_WHITESPACE = 2
+    TRAILING_WHITESPACE = 3
+    LINE_TOO_LONG = 4
+    EXTRANEOUS_WHITESPACE = 5
+    MULTIPLE_IMPORT = 6
+    BLANK_LINE_AFTER_DECORATOR = 7
+    NOT_ENOUGH_BLANK_LINES = 8
+    TOO_MANY_BLANK_LINES = 9
+    WRONG_NAMING = 10
+    HIGH_ORDER_FUNCTION_WITH_LAMBDA = 11
+    # far from the other types, plugins number their own types after them
+    SYNTAX_ERROR = 100
+
+
+# One record per violation. The rule is the name of the check and the
+# description is only formatted from its template when asked for, so both
+# are shared by all violations of a rule.
+# dinodon:disable check_naming
+class Violation:
+    __slots__ = ("rule", "level", "type", "line", "column", "template", \
+        "arguments")
+
+    def __init__(self, level, violation_type, line, column, template, \
+        arguments=None, rule=None):
+        self.rule = rule
+        self.level = level
+        self.type = violation_type
+        self.line = line
+        self.column = column
+        self.template = template
+        self.arguments = arguments
+
+    @property
+    def description(self):
+        if self.arguments is None:
+            return self.template
+        return self.template % self.arguments
+
+    def __repr__(self):
+        return "Violation(%s, line %d, column %d, %r)" \
+            % (self.rule, self.line, self.column, self.description)
+# dinodon:enable check_naming
+
+
+# Legacy results are tuples, plugins may use plain ints for level and type.
+# Their ints are kept as they are, they are not the built-in types.
+def _violation_from_tuple(result, rule):
+    violation_level, violation_type, line_info, description = result
+    if not isinstance(violation_level, ViolationLevel):
+        violation_level = ViolationLevel(violation_level)
+    return Violation(violation_level, violation_type, line_info[0], \
+        line_info[1], sys.intern(description), rule=rule)
+
+#
+# Check functions:
+# Return type: Violation, tuple or a list of them
+#   tuple: (Level: ViolationLevel,
+#           Type: ViolationType,
+#           Line info: (line_number: int, offset: int),
+#           Description: str)
+#
+
+# Check physical lines
+
+def check_tabs(physical_line, line_number):
+    # Test case:
+    # if True:\n\tb = 1\na = 2
+
+    match_obj = INDENT_REGEX.search(physical_line)
+    if match_obj is not None:
+        offset = match_obj.span()[0]
+        return Violation(ViolationLevel.ERROR, ViolationType.HAS_TAB, \
+            line_number, offset, "Indentation contains tabs")
+
+check_tabs.regex = re.compile("^[^\t\n]*\t", re.M)
+check_tabs.required_text = ("\t",)
+
+
+def check_trailing_whitespace(physical_line, line_number):
+    # Test case:
+    # if True: \nb = 1\na = 2\n    \n
+
+    whitespace_charset = " \t\v"
+    real_line = physical_line.rstrip(whitespace_charset)
+
+    if physical_line.lstrip(whitespace_charset).startswith("#"):
+        return
+
+    if real_line != physical_line:
+        if len(real_line) == 0:
+            return Violation(ViolationLevel.ERROR, \
+                ViolationType.BLANK_LINE_WHITESPACE, line_number, 0, \
+                "Blank line contains whitespace")
+        else:
+            return Violation(ViolationLevel.ERROR, \
+                ViolationType.TRAILING_WHITESPACE, line_number, len(real_line), \
+                "Line with trailing whitespace")
+
+check_trailing_whitespace.regex = re.compile("[ \t\v]$", re.M)
+
+
+def check_line_length(physical_line, line_number):
+    # Test case:
+    # a = "bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb"
+
+    real_line = physical_line.strip()
+    length = len(real_line)
+
+    if length > 80:
+        # Ignore long shebang line
+        if line_number == 0 and physical_line.startswith('#!'):
+            return
+
+        # Ignore comments
+        if real_line.startswith("#"):
+            return
+
+        return Violation(ViolationLevel.ERROR, ViolationType.LINE_TOO_LONG, \
+            line_number, 0, "Line too long")
+
+check_line_length.regex = re.compile("^.{81}", re.M)
+
+
+# Check logical lines
+#
+# A logical line is assembled from the tokens of one statement: comments are
+# dropped, strings are muted to "xxx" and continuation lines are joined. The
+# checks receive its text and the row of its first token, extar_params holds
+# the per-file context plus the tokens of the line and the mapping from
+# logical offsets back to physical (row, column).
+
+# Every lint owns its context, it is passed to the checks as extar_params
+def _new_logical_context(source):
+    return {
+        "previous_line": "",
+        "blank_lines": 0,
+        "previous_code_segment": "",
+        "indent_level": 0,
+        "tokens": [],
+        "mapping": [],
+        "source": source}
+
+
+def _logical_position(extar_params, offset):
+    for token_offset, (row, column) in reversed(extar_params["mapping"]):
+        if token_offset <= offset:
+            return (row, column + offset - token_offset)
+    return extar_params["mapping"][0][1]
+
+
+def check_extraneous_whitespace(logical_line, line_number, extar_params):
+    # Test case:
+    # aaa( aa[1], {bb: 2})
+
+    for match_obj in EXTRANEOUS_WHITESPACE_REGEX.finditer(logical_line):
+        text = match_obj.group()
+        # [({\s
+        if text.endswith(" "):
+            offset = match_obj.span()[0]
+            char = text[0]
+            return Violation(ViolationLevel.ERROR, \
+                ViolationType.EXTRANEOUS_WHITESPACE, \
+                *_logical_position(extar_params, offset), \
+                "Whitespace after %s", (char,))
+        # \s])}:; unless it closes a trailing comma
+        elif logical_line[match_obj.span()[0] - 1:match_obj.span()[0]] != ",":
+            offset = match_obj.span()[1] - 1
+            char = text[-1]
+            return Violation(ViolationLevel.ERROR, \
+                ViolationType.EXTRANEOUS_WHITESPACE, \
+                *_logical_position(extar_params, offset), \
+                "Whitespace before %s", (char,))
+
+
+def check_multiple_import(logical_line, line_number, extar_params):
+    # Test case:
+    # import re, copy
+
+    if logical_line.startswith("import "):
+        if "," in logical_line:
+            return Violation(ViolationLevel.ERROR, \
+                ViolationType.MULTIPLE_IMPORT, \
+                *_logical_position(extar_params, 0), \
+                "Multiple import in one line")
+
+check_multiple_import.line_kinds = ("import",)
+check_multiple_import.required_text = ("import", ",")
+
+
+def check_correct_blank_lines(logical_line, line_number, extar_params):
+    # Test case:
+    # def a():\n    return\ndef b(): \n    return 1
+
+    previous_line = extar_params["previous_line"]
+    blank_lines = extar_params["blank_lines"]
+    if blank_lines > 0 and previous_line.startswith("@"):
+        return Violation(ViolationLevel.ERROR, \
+            ViolationType.BLANK_LINE_AFTER_DECORATOR, line_number - blank_lines, \
+            0, "Blank line after decorator")
+
+    if extar_params["indent_level"] > 0 or previous_line.startswith("@"):
+        return
+
+    # decorators are counted as the start of their definition
+    previous_code_segment = extar_params["previous_code_segment"]
+    if logical_line.startswith("@") or DEFINITION_REGEX.match(logical_line):
+        if previous_code_segment == "function" or previous_code_segment == "class":
+            if blank_lines < 2:
+                return Violation(ViolationLevel.ERROR, \
+                    ViolationType.NOT_ENOUGH_BLANK_LINES, line_number, 0, \
+                    "Expected 2 blank lines, found %d", (blank_lines,))
+            if blank_lines > 2:
+                return Violation(ViolationLevel.ERROR, \
+                    ViolationType.TOO_MANY_BLANK_LINES, line_number, 0, \
+                    "Expected 2 blank lines, found %d", (blank_lines,))
+
+# Check AST
+
+def check_naming(node):
+    # Test case:
+    # aA, bB, cC, dD = 12, 12, 12, 12
+
+    names = []
+    is_common_naming = True
+
+    if isinstance(node, ast.ClassDef):
+        names = [(node, node.name)]
+        is_common_naming = False
+
+    if isinstance(node, ast.FunctionDef):
+        names = [(node, node.name)]
+
+    if isinstance(node, ast.Assign):
+        stack = list(node.targets)
+        while len(stack):
+            n = stack.pop(0)
+            if isinstance(n, ast.Tuple):
+                stack += n.elts
+            if isinstance(n, ast.Name):
+                names.append((n, n.id))
+
+    results = []
+    for name_node, name in names:
+        match_obj = None
+        if is_common_naming:
+            match_obj = COMMON_NAMING.search(name)
+        else:
+            match_obj = CLASS_NAMING.search(name)
+
+        if match_obj is None:
+            results.append(Violation(ViolationLevel.WARNING, \
+                ViolationType.WRONG_NAMING, name_node.lineno, \
+                name_node.col_offset, "Wrong format naming"))
+
+    return results
+
+check_naming.node_types = (ast.ClassDef, ast.FunctionDef, ast.Assign)
+
+
+def check_lambda_in_high_order_function(node):
+    # Test case:
+    # a = map(lambda x: x * x, b)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+        and node.func.id == "map" and isinstance(node.args[0], ast.Lambda):
+            return Violation(ViolationLevel.WARNING, \
+                ViolationType.HIGH_ORDER_FUNCTION_WITH_LAMBDA, node.lineno, \
+                node.col_offset, "Use lambda in high order function")
+
+check_lambda_in_high_order_function.node_types = (ast.Call,)
+check_lambda_in_high_order_function.required_text = ("map", "lambda")
+
+
+# Core checks
+
+ALL_CHECKS = {
+    "physical_line": [
+        check_tabs,
+        check_trailing_whitespace,
+        check_line_length],
+    "logical_line": [
+        check_extraneous_whitespace,
+        check_multiple_import,
+        check_correct_blank_lines],
+    "ast": [
+        check_naming,
+        check_lambda_in_high_order_function]
+}
+
+import sys
+import os
+import fnmatch
+import bisect
+import functools
+import time
+import operator
+
+# Hooks start a process per file, so modules only needed by the cache, the
+# report, plugins or the other commands are imported where they are used
+
+# use `# dinodon:disable xxx` to disable a specific rule
+# use `# dinodon:enable xxx` to enable a specific rule
+def _parse_directives(code):
+    directives = []
+    # most files have no directive at all
+    if "# dinodon:" not in code:
+        return directives
+
+    line_number = 1
+    position = 0
+    for match_obj in DIRECTIVE_REGEX.finditer(code):
+        line_number += code.count("\n", position, match_obj.start())
+        position = match_obj.start()
+        directives.append((line_number, match_obj.group(1), \
+            match_obj.group(2).split()))
+    return directives
+
+
+# Suppressions: rule name -> (starts, ends) of its disabled line ranges,
+# a rule disabled at line a and enabled at line b is suppressed in [a, b)
+def _add_suppression(suppressions, rule_name, start, end):
+    starts, ends = suppressions.setdefault(rule_name, ([], []))
+    starts.append(start)
+    ends.append(end)
+
+
+def _build_suppressions(directives):
+    suppressions = {}
+    disabled_since = {}
+
+    for line_number, action, rule_names in directives:
+        for rule_name in rule_names:
+            if action == "disable":
+                disabled_since.setdefault(rule_name, line_number)
+            elif rule_name in disabled_since:
+                _add_suppression(suppressions, rule_name, \
+                    disabled_since.pop(rule_name), line_number)
+
+    for rule_name in disabled_since:
+        _add_suppression(suppressions, rule_name, \
+            disabled_since[rule_name], sys.maxsize)
+    return suppressions
+
+
+def _is_suppressed(suppressions, rule_name, line_number):
+    ranges = suppressions.get(rule_name)
+    if ranges is None:
+        return False
+
+    starts, ends = ranges
+    index = bisect.bisect_right(starts, line_number) - 1
+    return index >= 0 and line_number < ends[index]
+
+
+# Lines where the set of suppressed rules may change
+def _suppression_boundaries(suppressions):
+    boundaries = set()
+    for starts, ends in suppressions.values():
+        boundaries.update(starts)
+        boundaries.update(ends)
+    boundaries.discard(sys.maxsize)
+    return sorted(boundaries)
+
+
+# keeps the order of `checks`
+def _active_checks(checks, suppressions, line_number):
+    return [check for check in checks \
+        if not _is_suppressed(suppressions, check.__name__, line_number)]
+
+
+NON_LOGICAL_TOKENS = frozenset([tokenize.COMMENT, tokenize.NL, \
+    tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER])
+# python 3.12 splits f-strings into several tokens
+MUTED_TOKENS = frozenset([tokenize.STRING, \
+    getattr(tokenize, "FSTRING_MIDDLE", tokenize.STRING)])
+
+
+def _mute_string(text):
+    # "abc" -> "xxx", keeps prefix and quotes
+    if text[-1] not in "\"'":
+        return "x" * len(text)
+
+    start = text.index(text[-1]) + 1
+    end = len(text) - 1
+    if text[-3:] in ('"""', "'''"):
+        start += 2
+        end -= 2
+    return text[:start] + "x" * (end - start) + text[end:]
+
+
+# Returns (logical_line, mapping) where mapping holds the logical offset
+# and physical start of every token
+def _build_logical_line(tokens, lines):
+    logical = []
+    mapping = []
+    length = 0
+    previous = None
+
+    for token in tokens:
+        if token.type in NON_LOGICAL_TOKENS:
+            continue
+
+        text = token.string
+        if token.type in MUTED_TOKENS:
+            text = _mute_string(text)
+
+        prefix = ""
+        if previous is not None:
+            (start_row, start_column) = token.start
+            (end_row, end_column) = previous.end
+            if start_row != end_row:
+                # joined continuation line
+                if previous.string == "," or (previous.string not in "([{" \
+                    and text not in ")]}"):
+                    prefix = " "
+            elif start_column != end_column:
+                prefix = lines[start_row - 1][end_column:start_column]
+
+        mapping.append((length + len(prefix), token.start))
+        logical.append(prefix + text)
+        length += len(prefix) + len(text)
+        previous = token
+
+    return "".join(logical), mapping
+
+
+# Logical checks declare the first token of the lines they handle with a
+# `line_kinds` attribute, checks without it are called on every line
+def _dispatch_logical_checks(checks, tokens, dispatch_table):
+    line_kind = None
+    for token in tokens:
+        if token.type not in NON_LOGICAL_TOKENS:
+            line_kind = token.string
+            break
+
+    line_checks = dispatch_table.get(line_kind)
+    if line_checks is None:
+        line_checks = [check for check in checks \
+            if getattr(check, "line_kinds", None) is None \
+            or line_kind in check.line_kinds]
+        dispatch_table[line_kind] = line_checks
+    return line_checks
+
+
+def _update_logical_context(context, logical_line):
+    context["previous_line"] = logical_line
+    context["blank_lines"] = 0
+
+    # only top level statements start a new code segment
+    if context["indent_level"] > 0 or logical_line.startswith("@"):
+        return
+
+    definition = DEFINITION_REGEX.match(logical_line)
+    if definition is None:
+        context["previous_code_segment"] = "other"
+    elif definition.group(1) == "class":
+        context["previous_code_segment"] = "class"
+    else:
+        context["previous_code_segment"] = "function"
+
+
+def _as_violation(result, rule):
+    if isinstance(result, Violation):
+        if result.rule is None:
+            result.rule = rule
+        return result
+    return _violation_from_tuple(result, rule)
+
+
+def _append_result(results, result, rule):
+    if result is not None:
+        if isinstance(result, list):
+            for item in result:
+                results.append(_as_violation(item, rule))
+        else:
+            results.append(_as_violation(result, rule))
+
+
+def _result_position(result):
+    return (result.line, result.column)
+
+
+# Results wait in a heap until no later check can report an earlier line,
+# the counter keeps results of the same position in the order they came
+def _push_results(pending, result, counter, rule):
+    if result is None:
+        return
+    if not isinstance(result, list):
+        result = [result]
+    for item in result:
+        violation = _as_violation(item, rule)
+        heapq.heappush(pending, ((violation.line, violation.column), \
+            next(counter), violation))
+
+
+def _pop_results(pending, last_row):
+    while len(pending) and pending[0][0][0] <= last_row:
+        yield heapq.heappop(pending)[2]
+
+
+# Every phase of a file shares one source dict: the code, its lines and
+# the ast tree. The lines are only split and the tree only parsed once some
+# phase or check needs them. Checks that
+# need the tree declare it with a `requires` attribute, e.g.
+# `check.requires = ("tree",)`. ast checks with the attribute are called
+# with the source dict as second argument, logical checks always find it
+# under the "source" key of their context.
+def _new_source(code, lines=None):
+    return {
+        "code": code,
+        "lines": lines,
+        "tree": None,
+        "syntax_error": None,
+        "parsed": False,
+        "changes": None}
+
+
+def _source_lines(source):
+    if source["lines"] is None:
+        source["lines"] = source["code"].split("\n")
+    return source["lines"]
+
+
+def _parse_source(source):
+    if not source["parsed"]:
+        source["parsed"] = True
+        try:
+            source["tree"] = ast.parse(source["code"])
+        except (SyntaxError, ValueError) as error:
+            source["syntax_error"] = error
+    return source["tree"]
+
+
+def _requires_tree(checks):
+    for check in checks:
+        if "tree" in getattr(check, "requires", ()):
+            return True
+    return False
+
+
+def _first_code_line(lines):
+    for line_number, line in enumerate(lines, 1):
+        stripped_line = line.strip()
+        if stripped_line != "" and not stripped_line.startswith("#"):
+            return line_number
+    return sys.maxsize
+
+
+# Checks disabled from the first line of code to the end of the file can
+# never report, unless they are interested in the module node at line 0
+def _live_ast_checks(checks, suppressions, lines):
+    if len(suppressions) == 0:
+        return checks
+
+    first_line = None
+    live_checks = []
+    for check in checks:
+        ranges = suppressions.get(check.__name__)
+        node_types = getattr(check, "node_types", None)
+        if ranges is None or node_types is None \
+            or issubclass(ast.Module, node_types):
+            live_checks.append(check)
+            continue
+
+        if first_line is None:
+            first_line = _first_code_line(lines)
+        starts, ends = ranges
+        index = bisect.bisect_right(starts, first_line) - 1
+        if index < 0 or ends[index] != sys.maxsize:
+            live_checks.append(check)
+    return live_checks
+
+
+def _syntax_error_violation(error):
+    line_number = getattr(error, "lineno", None) or 1
+    column = max((getattr(error, "offset", None) or 1) - 1, 0)
+    message = getattr(error, "msg", None) or str(error)
+    return Violation(ViolationLevel.ERROR, ViolationType.SYNTAX_ERROR, \
+        line_number, column, "Syntax error: %s", (message,), "syntax_error")
+
+
+# Changed lines
+#
+# With `changed_lines`, a list of (first, last) line ranges, only the
+# statements overlapping them are tokenized. Each window starts at the
+# statement before them in the innermost block holding them all, walking it
+# sets the logical context right again, and a few made up lines in front
+# give the tokenizer the indentation of the block. Physical and logical
+# checks only run on changed lines, ast checks only on nodes overlapping
+# them.
+
+def _build_changes(changed_lines):
+    starts = []
+    ends = []
+    for first_line, last_line in sorted(changed_lines):
+        if len(ends) and first_line <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], last_line)
+        else:
+            starts.append(first_line)
+            ends.append(last_line)
+    return (starts, ends)
+
+
+def _overlaps_changes(changes, first_line, last_line):
+    starts, ends = changes
+    index = bisect.bisect_right(starts, last_line) - 1
+    return index >= 0 and ends[index] >= first_line
+
+
+def _node_changed(node, changes):
+    first_line = getattr(node, "lineno", None)
+    if first_line is None:
+        return True
+    for decorator in getattr(node, "decorator_list", ()):
+        first_line = min(first_line, decorator.lineno)
+    last_line = getattr(node, "end_lineno", None) or first_line
+    return _overlaps_changes(changes, first_line, last_line)
+
+
+def _statement_start(statement):
+    start_line = statement.lineno
+    for decorator in getattr(statement, "decorator_list", ()):
+        start_line = min(start_line, decorator.lineno)
+    return start_line
+
+
+def _statement_bodies(statement):
+    bodies = [getattr(statement, "body", None), \
+        getattr(statement, "orelse", None), \
+        getattr(statement, "finalbody", None)]
+    for child in getattr(statement, "handlers", []) \
+        + getattr(statement, "cases", []):
+        bodies.append(child.body)
+    return [body for body in bodies if isinstance(body, list) and len(body)]
+
+
+# (start_row, end_row, indents) of the window for the changed lines
+# first_line..last_line among the statements of one block, or None when
+# it has to start in the enclosing block
+def _change_window(statements, first_line, last_line, indents, lines):
+    overlapping = []
+    span_start = 1
+    for index, statement in enumerate(statements):
+        # the blank lines and comments before a statement belong to it
+        if span_start <= last_line and statement.end_lineno >= first_line:
+            overlapping.append(index)
+        span_start = statement.end_lineno + 1
+    if len(overlapping) == 0:
+        return None
+
+    first_index = overlapping[0]
+    statement = statements[first_index]
+    if first_index == overlapping[-1]:
+        for body in _statement_bodies(statement):
+            if body[0].lineno <= statement.lineno \
+                or first_line < _statement_start(body[0]) \
+                or last_line > body[-1].end_lineno:
+                continue
+            indent = lines[body[0].lineno - 1][:body[0].col_offset]
+            window = None
+            if indent.strip() == "":
+                window = _change_window(body, first_line, last_line, \
+                    indents + [indent], lines)
+            if window is not None:
+                return window
+            break
+
+    if first_index == 0:
+        return None
+    previous = statements[first_index - 1]
+    start_line = _statement_start(previous)
+    if lines[start_line - 1][:previous.col_offset].strip() != "" \
+        or previous.end_lineno >= _statement_start(statement):
+        # statements sharing a line
+        return None
+    return (start_line, statements[overlapping[-1]].end_lineno, indents)
+
+
+def _change_windows(source, changes):
+    lines = _source_lines(source)
+    root_node = _parse_source(source)
+    if root_node is None:
+        return [(1, len(lines), [])]
+
+    changed_windows = []
+    for first_line, last_line in zip(*changes):
+        window = _change_window(root_node.body, first_line, last_line, [], \
+            lines)
+        if window is None:
+            window = (1, last_line, [])
+            for statement in root_node.body:
+                if _statement_start(statement) <= last_line:
+                    window = (1, max(last_line, statement.end_lineno), [])
+        changed_windows.append(window)
+
+    # overlapping windows are walked from the first start on
+    windows = []
+    for window in sorted(changed_windows, key=lambda item: item[:2]):
+        if len(windows) and window[0] <= windows[-1][1] + 1:
+            previous_window = windows.pop()
+            window = (previous_window[0], max(previous_window[1], \
+                window[1]), previous_window[2])
+        windows.append(window)
+    return windows
+
+
+def _tokenize_windows(code, lines, windows):
+    for start_row, end_row, indents in windows:
+        for token in _tokenize_from(code, lines, start_row, indents):
+            if token.start[0] > end_row:
+                break
+            yield token
+
+
+def _check_changed_physical_lines(lines, checks, suppressions, changes):
+    pending = []
+    counter = itertools.count()
+    for first_line, last_line in zip(*changes):
+        for row in range(first_line, min(last_line, len(lines)) + 1):
+            physical_checks = checks
+            if len(suppressions):
+                physical_checks = _active_checks(checks, suppressions, row)
+            for check in physical_checks:
+                _push_results(pending, check(lines[row - 1], row), counter, \
+                    check.__name__)
+            for result in _pop_results(pending, row):
+                yield result
+    for result in _pop_results(pending, sys.maxsize):
+        yield result
+
+
+# Tokens of the code from start_row on, positioned as in the whole file.
+# A line per indent in front puts the tokenizer into the block of start_row.
+def _tokenize_from(code, lines, start_row, indents=()):
+    offset = 0
+    for line in lines[:start_row - 1]:
+        offset += len(line) + 1
+
+    prefix = "".join([indent + "x\n" for indent in indents])
+    row_offset = start_row - 1 - len(indents)
+    readline = io.StringIO(prefix + code[offset:]).readline
+    for token in tokenize.generate_tokens(readline):
+        if token.start[0] <= len(indents):
+            continue
+        yield token._replace( \
+            start=(token.start[0] + row_offset, token.start[1]), \
+            end=(token.end[0] + row_offset, token.end[1]))
+
+
+# Batch checks
+#
+# Checks with a `batch = True` attribute are called once per file instead
+# of once per line, and return or yield all of their results:
+#
+#   physical_line: check(physical_lines), the lines of the file
+#   logical_line:  check(logical_lines), a list of (logical_line,
+#                  line_number, extar_params) with a copy of the context
+#                  every per-line check would get
+#
+# Their results are filtered by the directives like any other.
+
+def _batch_checks(checks):
+    return [check for check in checks if getattr(check, "batch", False)]
+
+
+def _line_checks(checks):
+    return [check for check in checks if not getattr(check, "batch", False)]
+
+
+def _has_batch_checks(rules):
+    for checks in rules.values():
+        if len(_batch_checks(checks)):
+            return True
+    return False
+
+
+def _push_batch_results(pending, checks, items, suppressions, counter):
+    for check in checks:
+        results = check(items)
+        if results is None:
+            continue
+        if isinstance(results, (Violation, tuple)):
+            results = [results]
+        for result in results:
+            violation = _as_violation(result, check.__name__)
+            if len(suppressions) == 0 or not _is_suppressed(suppressions, \
+                check.__name__, violation.line):
+                heapq.heappush(pending, ((violation.line, violation.column), \
+                    next(counter), violation))
+
+# Physical checks with a `regex` attribute are not called on every line:
+# the regex runs once over the whole code and the check is only called on
+# the lines it matches, so it has to match every line the check could
+# report on. `^` and `$` need re.M, e.g.
+# `check.regex = re.compile("[ \t]$", re.M)`.
+
+# Offsets of the lines in the code, they are joined by one "\n"
+def _line_starts(lines):
+    lengths = itertools.accumulate(map(len, lines))
+    return [0] + list(map(operator.add, lengths, itertools.count(1)))
+
+
+# {row: checks} of the rows from start_row on matched by their regexes
+def _regex_rows(source, checks, start_row):
+    regex_rows = {}
+    if len(checks) == 0:
+        return regex_rows
+
+    code = source["code"]
+    line_starts = _line_starts(_source_lines(source))
+    for check in checks:
+        last_row = 0
+        for match_obj in check.regex.finditer(code, \
+            line_starts[start_row - 1]):
+            row = bisect.bisect_right(line_starts, match_obj.start())
+            if row != last_row:
+                regex_rows.setdefault(row, []).append(check)
+                last_row = row
+    return regex_rows
+
+
+# Physical and logical checks share one walk over the tokens of the file,
+# physical lines are checked as the tokenizer moves past them and logical
+# lines once their NEWLINE token arrives. Yields results in line order.
+#
+# With a `window` (see relint_region) the walk starts at a checkpoint,
+# records the checkpoints it passes and stops at the first one after the
+# edit that matches the previous lint.
+def _check_lines(source, rules, suppressions, window=None):
+    code = source["code"]
+    lines = _source_lines(source)
+    pending = []
+    counter = itertools.count()
+    logical_context = _new_logical_context(source)
+
+    start_row = 1
+    checkpoint = None
+    if window is not None:
+        start_row = window["start"]
+        logical_context.update(window["context"])
+        checkpoint = (start_row, window["context"])
+
+    all_physical_checks = _line_checks(rules.get("physical_line", []))
+    all_logical_checks = _line_checks(rules.get("logical_line", []))
+    logical_batch_checks = _batch_checks(rules.get("logical_line", []))
+    hold_results = len(logical_batch_checks) > 0
+    # the lines handed to logical batch checks at the end, results are held
+    # until then
+    logical_lines = []
+    _push_batch_results(pending, _batch_checks(rules.get("physical_line", \
+        [])), lines, suppressions, counter)
+    logical_dispatch_table = None
+    for check in all_logical_checks:
+        if getattr(check, "line_kinds", None) is not None:
+            logical_dispatch_table = {}
+    changes = source["changes"]
+    if changes is not None:
+        # changed physical lines are checked on their own
+        all_physical_checks = []
+
+    # streamed lines have no buffer to run the regexes on
+    regex_checks = []
+    if code is not None:
+        regex_checks = [check for check in all_physical_checks \
+            if getattr(check, "regex", None) is not None]
+    regex_rows = _regex_rows(source, regex_checks, start_row)
+    regex_row_list = sorted(regex_rows)
+
+    # active physical checks only change on directive boundaries
+    boundaries = _suppression_boundaries(suppressions)
+    boundaries.append(sys.maxsize)
+    physical_state = {
+        "row": start_row - 1,
+        "boundary_index": bisect.bisect_left(boundaries, start_row),
+        "checks": all_physical_checks}
+    if start_row > 1 and len(suppressions):
+        physical_state["checks"] = _active_checks(all_physical_checks, \
+            suppressions, start_row - 1)
+    physical_state["line_checks"] = [check for check \
+        in physical_state["checks"] if check not in regex_checks]
+
+    def check_physical_lines(last_row):
+        row = physical_state["row"]
+        physical_checks = physical_state["checks"]
+        line_checks = physical_state["line_checks"]
+        boundary_index = physical_state["boundary_index"]
+
+        while row < last_row:
+            if len(line_checks) == 0:
+                # skip to the next row matched by a regex or a boundary
+                next_row = boundaries[boundary_index]
+                index = bisect.bisect_right(regex_row_list, row)
+                if index < len(regex_row_list):
+                    next_row = min(next_row, regex_row_list[index])
+                if next_row > last_row:
+                    row = last_row
+                    break
+                row = next_row - 1
+
+            line = lines[row]
+            row += 1
+            if row == boundaries[boundary_index]:
+                boundary_index += 1
+                physical_checks = _active_checks(all_physical_checks, \
+                    suppressions, row)
+                line_checks = [check for check in physical_checks \
+                    if check not in regex_checks]
+
+            row_checks = line_checks
+            matched_checks = regex_rows.get(row)
+            if matched_checks is not None:
+                row_checks = [check for check in physical_checks \
+                    if check in line_checks or check in matched_checks]
+
+            for check in row_checks:
+                _push_results(pending, check(line, row), counter, \
+                    check.__name__)
+
+        physical_state["row"] = row
+        physical_state["checks"] = physical_checks
+        physical_state["line_checks"] = line_checks
+        physical_state["boundary_index"] = boundary_index
+
+    if _requires_tree(rules.get("logical_line", [])):
+        _parse_source(source)
+
+    # streamed lines are read as they are tokenized and released after
+    # each logical line
+    readline = getattr(lines, "readline", None)
+    release = getattr(lines, "release", None)
+    if readline is None:
+        readline = io.StringIO(code).readline
+    if len(all_logical_checks) == 0 and not hold_results \
+        and window is None and release is None:
+        # physical lines alone are checked without the tokenizer
+        tokens = ()
+    elif changes is not None:
+        tokens = _tokenize_windows(code, lines, \
+            _change_windows(source, changes))
+    elif start_row > 1:
+        tokens = _tokenize_from(code, lines, start_row)
+    else:
+        tokens = tokenize.generate_tokens(readline)
+
+    logical_tokens = []
+    is_logical = False
+    try:
+        for token in tokens:
+            token_type = token.type
+            if token_type == tokenize.NEWLINE or token_type == tokenize.NL:
+                check_physical_lines(token.start[0])
+
+            if token_type == tokenize.NEWLINE and is_logical:
+                logical_tokens.append(token)
+                logical_line, mapping = _build_logical_line(logical_tokens, \
+                    lines)
+                first_token = mapping[0][1]
+                logical_context["indent_level"] = first_token[1]
+                logical_context["tokens"] = logical_tokens
+                logical_context["mapping"] = mapping
+
+                logical_checks = all_logical_checks
+                if logical_dispatch_table is not None:
+                    logical_checks = _dispatch_logical_checks( \
+                        all_logical_checks, logical_tokens, \
+                        logical_dispatch_table)
+                # blank lines before a logical line are checked with it
+                is_checked = changes is None or _overlaps_changes(changes, \
+                    first_token[0] - logical_context["blank_lines"], \
+                    token.start[0])
+                if not is_checked:
+                    logical_checks = ()
+                elif len(suppressions):
+                    logical_checks = _active_checks(logical_checks, \
+                        suppressions, first_token[0])
+                for check in logical_checks:
+                    _push_results(pending, check(logical_line, \
+                        first_token[0], logical_context), counter, \
+                        check.__name__)
+                if hold_results and is_checked:
+                    logical_lines.append((logical_line, first_token[0], \
+                        dict(logical_context)))
+
+                # set common logical info
+                _update_logical_context(logical_context, logical_line)
+                if window is not None:
+                    checkpoint = _next_checkpoint(window, logical_tokens, \
+                        logical_line, logical_context)
+                logical_tokens = []
+                is_logical = False
+                for result in _pop_results(pending, \
+                    0 if hold_results else token.start[0]):
+                    yield result
+                if release is not None:
+                    release(token.start[0] + 1)
+            elif not is_logical and (token_type == tokenize.NL \
+                or token_type == tokenize.NEWLINE):
+                # comments alone do not reset the blank line count, a top
+                # level comment ends the previous code segment
+                line = lines[token.start[0] - 1]
+                if line.strip() == "":
+                    logical_context["blank_lines"] += 1
+                elif line.startswith("#"):
+                    logical_context["previous_code_segment"] = "other"
+                logical_tokens = []
+                for result in _pop_results(pending, \
+                    0 if hold_results else token.start[0]):
+                    yield result
+                if release is not None:
+                    release(token.start[0] + 1)
+            else:
+                logical_tokens.append(token)
+                if not is_logical and token_type not in NON_LOGICAL_TOKENS:
+                    is_logical = True
+                    if checkpoint is not None:
+                        if _pass_checkpoint(window, checkpoint, token):
+                            break
+                        checkpoint = None
+    except (tokenize.TokenError, SyntaxError):
+        # unterminated or badly indented code, the rest is physical only
+        pass
+
+    if (window is None or window["end"] > len(lines)) \
+        and len(all_physical_checks):
+        check_physical_lines(len(lines))
+    _push_batch_results(pending, logical_batch_checks, logical_lines, \
+        suppressions, counter)
+    for result in _pop_results(pending, sys.maxsize):
+        yield result
+
+
+# ast checks declare the node types they handle with a `node_types`
+# attribute, checks without it are called on every node
+def _dispatch_checks(checks, node_type, dispatch_table):
+    node_checks = dispatch_table.get(node_type)
+    if node_checks is None:
+        node_checks = [check for check in checks \
+            if getattr(check, "node_types", None) is None \
+            or issubclass(node_type, check.node_types)]
+        dispatch_table[node_type] = node_checks
+    return node_checks
+
+
+def _check_ast_node(node, line_number, checks, dispatch_table, \
+    suppressions, source, results):
+    for check in _dispatch_checks(checks, type(node), dispatch_table):
+        if len(suppressions) == 0 \
+            or not _is_suppressed(suppressions, check.__name__, line_number):
+            if getattr(check, "requires", None) is None:
+                result = check(node)
+            else:
+                result = check(node, source)
+            _append_result(results, result, check.__name__)
+
+
+# Top level statements come in line order, only the results within one of
+# them need sorting
+def _check_ast_statements(root_node, checks, suppressions, dispatch_table, \
+    source):
+    changes = source["changes"]
+    for statement in ast.iter_child_nodes(root_node):
+        results = []
+        line_number = 0
+
+        # depth first, one child iterator per level
+        stack = [iter((statement,))]
+        while len(stack):
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+            # children of an unchanged node are unchanged too
+            if changes is not None and not _node_changed(node, changes):
+                continue
+            stack.append(ast.iter_child_nodes(node))
+
+            # nodes without a position are attributed to their parent's line
+            line_number = getattr(node, "lineno", line_number)
+            _check_ast_node(node, line_number, checks, dispatch_table, \
+                suppressions, source, results)
+
+        results.sort(key=_result_position)
+        for result in results:
+            yield result
+
+
+def _check_ast(source, rules, suppressions):
+    lines = None
+    if len(suppressions):
+        lines = _source_lines(source)
+    all_checks = _live_ast_checks(rules.get("ast", []), suppressions, lines)
+    if len(all_checks) == 0:
+        return
+    for check in all_checks:
+        if getattr(check, "requires", None) is not None:
+            # checks given the source may read its lines
+            _source_lines(source)
+
+    root_node = _parse_source(source)
+    if root_node is None:
+        # physical and logical checks still run on code that does not parse
+        yield _syntax_error_violation(source["syntax_error"])
+        return
+
+    dispatch_table = {}
+    module_results = []
+    _check_ast_node(root_node, 0, all_checks, dispatch_table, suppressions, \
+        source, module_results)
+    module_results.sort(key=_result_position)
+
+    yield from heapq.merge(module_results, _check_ast_statements(root_node, \
+        all_checks, suppressions, dispatch_table, source), \
+        key=_result_position)
+
+# Textual pre-filters
+#
+# Checks can declare text a file has to contain for them to ever report:
+# `required_text`, substrings that must all appear, and `required_regex`,
+# a compiled regex that must match somewhere, e.g.
+# `check.required_text = ("map", "lambda")`. They are tested once against
+# the whole code, checks that cannot match are dropped for the file before
+# any line or node is visited.
+
+def _can_match(check, code):
+    for text in getattr(check, "required_text", ()):
+        if text not in code:
+            return False
+    required_regex = getattr(check, "required_regex", None)
+    return required_regex is None or required_regex.search(code) is not None
+
+
+# A mapped file is searched for the encoded text, regexes and text across
+# lines are left to the checks
+def _can_match_mapped(check, mapped, encoding):
+    if encoding == "utf-8-sig":
+        encoding = "utf-8"
+    for text in getattr(check, "required_text", ()):
+        if "\n" not in text and "\r" not in text \
+            and mapped.find(text.encode(encoding)) == -1:
+            return False
+    return True
+
+
+def _prefilter_rules(rules, can_match):
+    filtered_rules = {}
+    for lint_type, checks in rules.items():
+        filtered_rules[lint_type] = [check for check in checks \
+            if can_match(check)]
+    return filtered_rules
+
+
+def _skipped_rules(rules, filtered_rules):
+    return sorted([check.__name__ for lint_type in rules \
+        for check in rules[lint_type] \
+        if check not in filtered_rules[lint_type]])
+
+# Lint
+#
+# iter_violations yields the results of each phase as they are produced,
+# merged in (line, column) order, so a caller can stop linting by simply
+# not asking for more. Checks are expected to report positions at or before
+# the line they are called on.
+#
+# Both functions keep all of their state in the call, so they are reentrant
+# and safe to call concurrently, e.g. from a thread pool. `rules` maps a
+# lint type to its checks like ALL_CHECKS, which is the default.
+
+def iter_violations(code, rules=None, changed_lines=None):
+    if rules is None:
+        rules = ALL_CHECKS
+    rules = _prefilter_rules(rules, functools.partial(_can_match, code=code))
+    # phases without checks are skipped with their split, tokenize and parse
+    has_line_checks = len(rules.get("physical_line", [])) > 0 \
+        or len(rules.get("logical_line", [])) > 0
+    if not has_line_checks and len(rules.get("ast", [])) == 0:
+        return iter(())
+
+    source = _new_source(code)
+    suppressions = _build_suppressions(_parse_directives(code))
+    if changed_lines is None:
+        if not has_line_checks:
+            return _check_ast(source, rules, suppressions)
+        return heapq.merge(_check_lines(source, rules, suppressions), \
+            _check_ast(source, rules, suppressions), key=_result_position)
+
+    changes = _build_changes(changed_lines)
+    source["changes"] = changes
+    results = heapq.merge(_check_changed_physical_lines( \
+        _source_lines(source), _line_checks(rules.get("physical_line", [])), \
+        suppressions, changes), \
+        _check_lines(source, rules, suppressions), \
+        _check_ast(source, rules, suppressions), key=_result_position)
+    return (result for result in results \
+        if _overlaps_changes(changes, result.line, result.line))
+
+
+def lint_source(code, rules=None):
+    return list(iter_violations(code, rules))
+
+# Incremental lint
+#
+# lint_snapshot returns the results of a file together with what is needed
+# to lint a part of it again: its directives and checkpoints. A checkpoint
+# is a row where a top level statement starts, the tokenizer holds no state
+# there and the logical context is saved with it.
+#
+# relint_region takes a snapshot and an edit, given as the changed lines
+# start_line..end_line of the new code and the number of lines the edit
+# added (negative when it removed lines). Everything from the last
+# checkpoint before the edit to the first one after it with an unchanged
+# context is linted again, ast checks only on the top level statements in
+# between. The previous results of all other lines are spliced in, and a
+# snapshot of the new code is returned.
+#
+# Logical checks that keep their own values in the context should replace
+# them rather than change them in place, checkpoints copy it shallowly.
+
+CLAUSE_KEYWORDS = frozenset(["elif", "else", "except", "finally"])
+LOCAL_CONTEXT_KEYS = frozenset(["tokens", "mapping", "source", "indent_level"])
+
+
+def _context_checkpoint(context):
+    return {key: value for key, value in context.items() \
+        if key not in LOCAL_CONTEXT_KEYS}
+
+
+# The row after a logical line is a checkpoint candidate until the next
+# logical line shows whether a top level statement starts there
+def _next_checkpoint(window, tokens, logical_line, context):
+    depth = 0
+    for token in tokens:
+        if token.type == tokenize.OP:
+            if token.string in "([{":
+                depth += 1
+            elif token.string in ")]}":
+                depth -= 1
+    if depth != 0:
+        # the tokenizer cannot be restarted after a stray closing bracket
+        window["unbalanced"] = True
+
+    if window["unbalanced"] or logical_line.startswith("@"):
+        return None
+    return (tokens[-1].start[0] + 1, _context_checkpoint(context))
+
+
+# Called with the first token of the logical line after a checkpoint,
+# returns True once the walk has caught up with the previous lint
+def _pass_checkpoint(window, checkpoint, token):
+    row, context = checkpoint
+    if token.start[1] != 0 or token.string in CLAUSE_KEYWORDS:
+        return False
+
+    if row > window["resync"]:
+        previous = window["previous_checkpoints"].get(row - window["delta"])
+        if previous is not None and previous[1] == context:
+            window["end"] = row
+            return True
+
+    window["checkpoints"][row] = (token.start[0], context)
+    return False
+
+
+def _new_window(start_row, context, previous_checkpoints, resync_row, \
+    line_delta, line_count):
+    return {
+        "start": start_row,
+        "context": context,
+        "checkpoints": {},
+        "previous_checkpoints": previous_checkpoints,
+        "resync": resync_row,
+        "delta": line_delta,
+        "end": line_count + 1,
+        "unbalanced": False}
+
+
+# Directives outside of the changed lines, in the coordinates of the new
+# code, or None when one of them was edited
+def _unchanged_directives(directives, start_line, end_line, line_delta):
+    unchanged_directives = []
+    for line_number, action, rule_names in directives:
+        if line_number > end_line:
+            line_number += line_delta
+        elif line_number >= start_line:
+            return None
+        unchanged_directives.append((line_number, action, rule_names))
+    return unchanged_directives
+
+
+def _shift_violation(result, line_delta):
+    if line_delta == 0:
+        return result
+    return Violation(result.level, result.type, result.line + line_delta, \
+        result.column, result.template, result.arguments, result.rule)
+
+
+# ast checks on the top level statements of the window only, None when
+# they need the whole tree
+def _check_ast_window(source, rules, suppressions, start_row, end_row):
+    lines = _source_lines(source)
+    checks = _live_ast_checks(rules.get("ast", []), suppressions, lines)
+    for check in checks:
+        node_types = getattr(check, "node_types", None)
+        if node_types is None or issubclass(ast.Module, node_types) \
+            or getattr(check, "requires", None) is not None:
+            return None
+    if len(checks) == 0:
+        return []
+
+    try:
+        root_node = ast.parse("\n".join(lines[start_row - 1:end_row - 1]))
+    except (SyntaxError, ValueError):
+        return None
+    ast.increment_lineno(root_node, start_row - 1)
+    return list(_check_ast_statements(root_node, checks, suppressions, {}, \
+        source))
+
+
+def lint_snapshot(code, rules=None):
+    if rules is None:
+        rules = ALL_CHECKS
+    filtered_rules = _prefilter_rules(rules, functools.partial(_can_match, \
+        code=code))
+    skipped_rules = _skipped_rules(rules, filtered_rules)
+    rules = filtered_rules
+
+    source = _new_source(code)
+    directives = _parse_directives(code)
+    suppressions = _build_suppressions(directives)
+    window = _new_window(1, _context_checkpoint(_new_logical_context(None)), \
+        {}, sys.maxsize, 0, len(_source_lines(source)))
+    results = list(heapq.merge(_check_lines(source, rules, suppressions, \
+        window), _check_ast(source, rules, suppressions), \
+        key=_result_position))
+
+    return {
+        "results": results,
+        "checkpoints": window["checkpoints"],
+        "directives": directives,
+        "line_count": len(_source_lines(source)),
+        "skipped_rules": skipped_rules}
+
+
+def relint_region(snapshot, code, start_line, end_line, line_delta=0, \
+    rules=None):
+    if rules is None:
+        rules = ALL_CHECKS
+
+    source = _new_source(code)
+    lines = _source_lines(source)
+    directives = _parse_directives(code)
+    previous_end = end_line - line_delta
+    filtered_rules = _prefilter_rules(rules, functools.partial(_can_match, \
+        code=code))
+    # batch checks need all lines of the file, and a check that was skipped
+    # before may report anywhere
+    if len(lines) != snapshot["line_count"] + line_delta \
+        or _has_batch_checks(filtered_rules) \
+        or _skipped_rules(rules, filtered_rules) \
+        != snapshot["skipped_rules"]:
+        return lint_snapshot(code, rules)
+
+    # a changed directive may change the results of any line
+    unchanged_directives = _unchanged_directives(directives, start_line, \
+        end_line, 0)
+    if unchanged_directives is None or unchanged_directives \
+        != _unchanged_directives(snapshot["directives"], start_line, \
+        previous_end, line_delta):
+        return lint_snapshot(code, rules)
+
+    # the statement at the checkpoint must start before the edit
+    start_row = None
+    for row, (statement_row, context) in snapshot["checkpoints"].items():
+        if statement_row >= start_line:
+            break
+        start_row = row
+        start_context = context
+    if start_row is None:
+        return lint_snapshot(code, rules)
+
+    suppressions = _build_suppressions(directives)
+    window = _new_window(start_row, start_context, snapshot["checkpoints"], \
+        end_line, line_delta, len(lines))
+    line_results = list(_check_lines(source, filtered_rules, suppressions, \
+        window))
+    end_row = window["end"]
+    previous_end_row = end_row - line_delta
+
+    ast_rules = set([check.__name__ \
+        for check in filtered_rules.get("ast", [])])
+    ast_rules.add("syntax_error")
+    ast_results = None
+    if not any(result.rule == "syntax_error" \
+        for result in snapshot["results"]):
+        ast_results = _check_ast_window(source, filtered_rules, suppressions, \
+            start_row, end_row)
+
+    before_results = []
+    window_results = [result for result in line_results \
+        if result.line < end_row]
+    after_results = []
+    for result in snapshot["results"]:
+        if ast_results is None and result.rule in ast_rules:
+            continue
+        if result.line < start_row:
+            before_results.append(result)
+        elif result.line >= previous_end_row:
+            after_results.append(_shift_violation(result, line_delta))
+
+    if ast_results is None:
+        # the whole tree is checked again
+        results = list(heapq.merge(before_results + window_results \
+            + after_results, _check_ast(source, filtered_rules, suppressions), \
+            key=_result_position))
+    else:
+        results = before_results + list(heapq.merge(window_results, \
+            ast_results, key=_result_position)) + after_results
+
+    checkpoints = {}
+    for row, checkpoint in snapshot["checkpoints"].items():
+        if row < start_row:
+            checkpoints[row] = checkpoint
+    checkpoints.update(window["checkpoints"])
+    for row, (statement_row, context) in snapshot["checkpoints"].items():
+        if row >= previous_end_row:
+            checkpoints[row + line_delta] = (statement_row + line_delta, \
+                context)
+
+    return {
+        "results": results,
+        "checkpoints": checkpoints,
+        "directives": directives,
+        "line_count": len(lines),
+        "skipped_rules": snapshot["skipped_rules"]}
+
+# Log
+
+class Log:
+    def info(message):
+        print(message)
+
+    def error(message):
+        print("Error: %s" % message)
+
+    def warning(message):
+        print("Warning: %s" % message)
+
+
+def _log_result(result, lint_file=None):
+    message = "line %d, column %d <%s>" \
+        % (result.line, result.column, result.description)
+    if lint_file is not None:
+        message = "%s: %s" % (lint_file, message)
+
+    if result.level == ViolationLevel.WARNING:
+        Log.warning(message)
+    else:
+        Log.error(message)
+
+# Plugins
+#
+# `--plugins=value` loads a plugin from a file path, an installed module or
+# an entry point of the "dinodon.plugins" group. A plugin declares its rules
+# in a `manifest`:
+#
+#   manifest = {
+#       "name": "singleton",
+#       "version": "0.1.0",
+#       "cacheable": True,
+#       "rules": [
+#           {"id": "check_is_with_singleton", "phase": "physical_line"},
+#           {"id": "check_print", "phase": "ast", "node_types": ["Call"]},
+#           {"id": "check_import", "phase": "logical_line",
+#               "line_kinds": ["import", "from"], "required_text": ["import"]},
+#           {"id": "check_duplicates", "phase": "physical_line",
+#               "batch": True}]}
+#
+# The id is the name of the check in the module. node_types, line_kinds,
+# batch, required_text and required_regex become attributes of the check,
+# so it is only called on those nodes and logical lines, once per file or
+# on files containing the text. Results of plugins that are not
+# cacheable (e.g. they read other files) are never stored in the cache.
+# Plugins with only a legacy `plugins` dict of checks per phase are loaded
+# as they are.
+#
+# Looking up an entry point reads the metadata of every installed package.
+# Hooks launch once per file, so the entry points found are kept in the
+# cache directory as {name: "module:attribute"} and imported directly by
+# later launches, until they fail to import.
+
+PLUGIN_GROUP = "dinodon.plugins"
+PLUGIN_REGISTRY = "plugins.json"
+PLUGINS = {}
+
+
+def _load_plugin_registry(registry_path):
+    import json
+
+    try:
+        with open(registry_path, 'r') as f:
+            registry = json.load(f)
+        # keep it from being pruned with old cache entries
+        os.utime(registry_path)
+    except (OSError, ValueError):
+        return {}
+    return registry
+
+
+def _store_plugin_registry(registry_path, registry):
+    import json
+
+    try:
+        os.makedirs(os.path.dirname(registry_path) or ".", exist_ok=True)
+        temp_path = "%s.%d.tmp" % (registry_path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(registry, f)
+        os.replace(temp_path, registry_path)
+    except OSError:
+        pass
+
+
+def _load_entry_point_value(value):
+    import importlib
+
+    module_name, separator, attribute = value.partition(":")
+    target = importlib.import_module(module_name.strip())
+    if separator:
+        for name in attribute.strip().split("."):
+            target = getattr(target, name)
+    return target
+
+
+def _plugin_entry_point(name):
+    try:
+        from importlib import metadata
+    except ImportError:
+        return None
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        entry_points = entry_points.select(group=PLUGIN_GROUP)
+    else:
+        entry_points = entry_points.get(PLUGIN_GROUP, [])
+    for entry_point in entry_points:
+        if entry_point.name == name:
+            return entry_point
+    return None
+
+
+def _import_plugin(value, registry_path=None):
+    import importlib
+    import importlib.util
+
+    if value.endswith(".py") or os.path.isfile(value):
+        import hashlib
+
+        if not os.path.isfile(value):
+            raise ImportError("No plugin file %s" % value)
+        # named after the absolute path, so a plugin called json.py does not
+        # shadow the json module
+        path = os.path.abspath(value)
+        name = "dinodon_plugin_%s_%s" % (re.sub(r"\W", "_", \
+            os.path.splitext(os.path.basename(path))[0]), \
+            hashlib.sha256(path.encode()).hexdigest()[:12])
+        if name in sys.modules:
+            return sys.modules[name]
+        spec = importlib.util.spec_from_file_location(name, path)
+        if spec is None:
+            raise ImportError("No plugin file %s" % value)
+        module = importlib.util.module_from_spec(spec)
+        # the cache fingerprint finds the source of checks by their module
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+        return module
+
+    try:
+        return importlib.import_module(value)
+    except ModuleNotFoundError as error:
+        if error.name != value:
+            raise
+
+    registry = {}
+    if registry_path is not None:
+        registry = _load_plugin_registry(registry_path)
+        if value in registry:
+            try:
+                return _load_entry_point_value(registry[value])
+            except (ImportError, AttributeError):
+                pass
+
+    entry_point = _plugin_entry_point(value)
+    if entry_point is None:
+        raise ImportError("No plugin module or entry point %s" % value)
+    module = entry_point.load()
+    if registry_path is not None:
+        registry[value] = entry_point.value
+        _store_plugin_registry(registry_path, registry)
+    return module
+
+
+# Returns {"name", "version", "cacheable", "rules": [(phase, check)]}
+def _plugin_manifest(module, value):
+    manifest = getattr(module, "manifest", None)
+    if manifest is None:
+        rules = []
+        for lint_type, checks in module.plugins.items():
+            rules += [(lint_type, check) for check in checks]
+        return {
+            "name": getattr(module, "__name__", value),
+            "version": None,
+            "cacheable": True,
+            "rules": rules}
+
+    cacheable = manifest.get("cacheable", True)
+    rules = []
+    for rule in manifest["rules"]:
+        check = getattr(module, rule["id"], None)
+        phase = rule.get("phase")
+        if not callable(check):
+            raise ValueError("No check %s" % rule["id"])
+        if phase not in ALL_CHECKS:
+            raise ValueError("Unknown phase %s of %s" % (phase, rule["id"]))
+
+        if "node_types" in rule:
+            check.node_types = tuple([getattr(ast, node_type) \
+                for node_type in rule["node_types"]])
+        if "line_kinds" in rule:
+            check.line_kinds = tuple(rule["line_kinds"])
+        if rule.get("batch", False):
+            check.batch = True
+        if "required_text" in rule:
+            check.required_text = tuple(rule["required_text"])
+        if "required_regex" in rule:
+            check.required_regex = re.compile(rule["required_regex"])
+        if not cacheable:
+            check.cacheable = False
+        rules.append((phase, check))
+
+    return {
+        "name": manifest.get("name", value),
+        "version": manifest.get("version"),
+        "cacheable": cacheable,
+        "rules": rules}
+
+
+# Returns False when the plugin cannot be loaded. Entry points are looked up
+# in the registry at registry_path first, when given.
+def _add_plugins(option, registry_path=None):
+    value = option.split("=", 1)[1]
+    try:
+        plugin = _plugin_manifest(_import_plugin(value, registry_path), value)
+    except (ImportError, AttributeError, KeyError, TypeError, \
+        ValueError) as error:
+        Log.error("Cannot load plugin %s: %s" % (value, error))
+        return False
+
+    # workers may load the same plugin again
+    if plugin["name"] in PLUGINS:
+        return True
+    PLUGINS[plugin["name"]] = plugin
+    for lint_type, check in plugin["rules"]:
+        if check not in ALL_CHECKS[lint_type]:
+            ALL_CHECKS[lint_type].append(check)
+    return True
+
+# Rule selection
+#
+# `--select=names` and `--ignore=names` take rule names or phases, e.g.
+# `--select=physical_line,check_naming`. The project config file (default
+# .dinodon.json) sets them for all files and overrides them per path:
+#
+#   {
+#       "select": ["physical_line", "logical_line", "check_naming"],
+#       "ignore": ["check_line_length"],
+#       "overrides": [
+#           {"paths": ["generated/*", "vendor/*"], "select": ["physical_line"]},
+#           {"paths": ["tests/*"], "ignore": ["check_naming"]}]}
+#
+# Options on the command line replace the select of the config and add to
+# its ignore. An override replaces the select and adds to the ignore, the
+# last override matching a path wins. The selection is compiled once into
+# the rules of every override, a phase left without rules is skipped.
+
+CONFIG_PATH = ".dinodon.json"
+PIPELINES = {}
+
+
+def _selection_names(selection):
+    names = list(selection.get("select") or []) + selection["ignore"]
+    for override in selection["overrides"]:
+        names += list(override.get("select") or []) \
+            + override.get("ignore", [])
+    return names
+
+
+# Returns why a selection is invalid, or None. `check_names` is False when
+# the plugins defining some of the rules are not loaded.
+def _selection_error(selection, check_names=True):
+    if not isinstance(selection, dict) \
+        or not isinstance(selection.get("ignore"), list) \
+        or not isinstance(selection.get("overrides"), list) \
+        or not isinstance(selection.get("select", []), (list, type(None))):
+        return "Invalid selection"
+    for override in selection["overrides"]:
+        if not isinstance(override, dict) \
+            or not isinstance(override.get("paths"), list) \
+            or not all([isinstance(path, str) for path in override["paths"]]):
+            return "Override without paths"
+        if not isinstance(override.get("select", []), list) \
+            or not isinstance(override.get("ignore", []), list):
+            return "Invalid override"
+    if not check_names:
+        return None
+
+    rule_names = set(ALL_CHECKS)
+    for lint_type in ALL_CHECKS:
+        rule_names.update([check.__name__ for check in ALL_CHECKS[lint_type]])
+    for name in _selection_names(selection):
+        if not isinstance(name, str) or name not in rule_names:
+            return "Unknown rule %s" % name
+    return None
+
+
+# Returns the selection of the config file and the options, or None when
+# it is invalid. It is plain data, so it can be handed to workers.
+def _load_selection(options, check_names=True):
+    config_path = CONFIG_PATH
+    has_config = False
+    select = None
+    ignore = []
+    for option in options:
+        if option.startswith("--config="):
+            config_path = option.split("=", 1)[1]
+            has_config = True
+        if option.startswith("--select="):
+            select = (select or []) + option.split("=", 1)[1].split(",")
+        if option.startswith("--ignore="):
+            ignore += option.split("=", 1)[1].split(",")
+
+    selection = {}
+    if has_config or os.path.exists(config_path):
+        import json
+
+        try:
+            with open(config_path, 'r') as f:
+                selection = json.load(f)
+        except (OSError, ValueError) as error:
+            Log.error("Cannot read config %s: %s" % (config_path, error))
+            return None
+
+    if not isinstance(selection, dict):
+        Log.error("Invalid selection in %s" % config_path)
+        return None
+    if select is not None:
+        selection["select"] = select
+    selection["ignore"] = selection.get("ignore", []) + ignore
+    selection.setdefault("overrides", [])
+    error = _selection_error(selection, False)
+    if error is not None:
+        Log.error("%s in %s" % (error, config_path))
+        return None
+    if check_names:
+        error = _selection_error(selection)
+        if error is not None:
+            Log.error(error)
+            return None
+    return selection
+
+
+def _select_rules(select, ignore):
+    if select is None and len(ignore) == 0:
+        return ALL_CHECKS
+
+    rules = {}
+    for lint_type in ALL_CHECKS:
+        rules[lint_type] = [check for check in ALL_CHECKS[lint_type] \
+            if (select is None or lint_type in select \
+            or check.__name__ in select) and lint_type not in ignore \
+            and check.__name__ not in ignore]
+    return rules
+
+
+# {"rules": rules, "overrides": [(paths, rules)]}, compiled once per process
+# after the plugins are loaded
+def _compiled_pipeline(selection):
+    if selection is None or (selection.get("select") is None \
+        and len(selection["ignore"]) == 0 and len(selection["overrides"]) == 0):
+        return {"rules": ALL_CHECKS, "overrides": []}
+
+    import json
+
+    key = json.dumps(selection, sort_keys=True)
+    pipeline = PIPELINES.get(key)
+    if pipeline is None:
+        select = selection.get("select")
+        ignore = selection["ignore"]
+        pipeline = {"rules": _select_rules(select, ignore), "overrides": []}
+        for override in selection["overrides"]:
+            pipeline["overrides"].append((override["paths"], _select_rules( \
+                override.get("select", select), \
+                ignore + override.get("ignore", []))))
+        PIPELINES[key] = pipeline
+    return pipeline
+
+
+# `root` is the directory override paths are relative to, the current one
+# by default
+def _pipeline_rules(pipeline, lint_file, root=None):
+    rules = pipeline["rules"]
+    if len(pipeline["overrides"]):
+        path = os.path.relpath(lint_file, root)
+        for paths, override_rules in pipeline["overrides"]:
+            if _matches_patterns(path, paths):
+                rules = override_rules
+    return rules
+
+
+# Files
+
+GLOB_REGEX = re.compile("[*?[]")
+DEFAULT_EXCLUDES = [".git", ".hg", ".svn", ".tox", ".venv", "__pycache__"]
+
+
+def _matches_patterns(path, patterns):
+    name = os.path.basename(path)
+    for pattern in patterns:
+        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def _is_excluded(path, excludes):
+    return _matches_patterns(path, excludes)
+
+
+def _walk_directory(directory, excludes):
+    lint_files = []
+    for root, dirs, files in os.walk(directory):
+        # sort in place so os.walk descends in a stable order
+        dirs[:] = sorted([name for name in dirs \
+            if not _is_excluded(os.path.join(root, name), excludes)])
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(".py") and not _is_excluded(path, excludes):
+                lint_files.append(path)
+    return lint_files
+
+
+# Directories are searched recursively, glob patterns support `**`,
+# explicitly named files are always linted
+def _discover_files(lint_paths, excludes):
+    lint_files = []
+    for lint_path in lint_paths:
+        if GLOB_REGEX.search(lint_path) is None:
+            if os.path.isdir(lint_path):
+                lint_files += _walk_directory(lint_path, \
+                    DEFAULT_EXCLUDES + excludes)
+            else:
+                lint_files.append(lint_path)
+            continue
+
+        import glob
+
+        for path in sorted(glob.glob(lint_path, recursive=True)):
+            if os.path.isdir(path):
+                lint_files += _walk_directory(path, DEFAULT_EXCLUDES + excludes)
+            elif path.endswith(".py") and not _is_excluded(path, excludes):
+                lint_files.append(path)
+
+    # a file can be reached from several paths, keep its first position
+    found_files = set()
+    unique_files = []
+    for lint_file in lint_files:
+        real_path = os.path.normpath(lint_file)
+        if real_path not in found_files:
+            found_files.add(real_path)
+            unique_files.append(lint_file)
+    return unique_files
+
+
+def _decode_source(data):
+    # honour coding cookies and BOM, then translate newlines like open()
+    encoding = tokenize.detect_encoding(io.BytesIO(data).readline)[0]
+    code = data.decode(encoding)
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _read_source(lint_file):
+    with open(lint_file, 'rb') as f:
+        return _decode_source(f.read())
+
+
+# Files of at least LARGE_FILE_SIZE bytes are memory-mapped, see dinodon_mmap
+LARGE_FILE_SIZE = 32 * 1024 * 1024
+
+
+# Returns {file: [(first, last)]} of the lines added or changed since the
+# revision, for the files under lint_paths, or None when git fails
+def _git_changes(revision, lint_paths):
+    import subprocess
+
+    try:
+        top_directory = subprocess.run(["git", "rev-parse", \
+            "--show-toplevel"], capture_output=True, text=True, \
+            check=True).stdout.strip()
+        diff = subprocess.run(["git", "diff", "--unified=0", "--no-color", \
+            "--no-ext-diff", "--diff-filter=ACMR", "--src-prefix=a/", \
+            "--dst-prefix=b/", revision, "--"] + lint_paths, \
+            capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as error:
+        Log.error("git diff %s failed: %s" % (revision, \
+            getattr(error, "stderr", None) or error))
+        return None
+
+    changes = {}
+    changed_lines = None
+    for line in diff.split("\n"):
+        if line.startswith("+++ "):
+            # paths with spaces end with a tab
+            path = line[4:].rstrip("\t")
+            if path.startswith('"'):
+                # git quotes unusual paths C style
+                path = ast.literal_eval(path)
+            changed_lines = changes.setdefault(os.path.relpath(os.path.join( \
+                top_directory, path[2:])), [])
+        elif line.startswith("@@ ") and changed_lines is not None:
+            # @@ -start[,count] +start[,count] @@
+            added = line.split(" ")[2][1:].split(",")
+            first_line = int(added[0])
+            count = 1 if len(added) == 1 else int(added[1])
+            if count > 0:
+                changed_lines.append((first_line, first_line + count - 1))
+    return changes
+
+
+# Cache
+#
+# Results are stored per file under `<directory>/<key[:2]>/<key>.json`,
+# the key hashes the file content together with the rule set. Entries are
+# touched on every hit so pruning by mtime evicts the least recently used.
+#
+# Walking the whole cache costs more than linting a file, so it is only
+# pruned when it may be over its size: `count` holds the number of entries
+# left by the last prune and every stored entry appends a byte to `writes`.
+
+CACHE_DIRECTORY = ".dinodon_cache"
+CACHE_SIZE = 10000
+CACHE_COUNT = "count"
+CACHE_WRITES = "writes"
+
+
+# VERSION, every active check, the manifests of the plugins and the source
+# of the modules defining them
+def _rules_fingerprint():
+    import hashlib
+    import json
+
+    hasher = hashlib.sha256(VERSION.encode())
+    source_files = []
+
+    for lint_type in sorted(ALL_CHECKS):
+        hasher.update(lint_type.encode())
+        for check in ALL_CHECKS[lint_type]:
+            hasher.update(check.__name__.encode())
+            module = sys.modules.get(check.__module__)
+            source_file = getattr(module, "__file__", None)
+            if source_file is not None and source_file not in source_files:
+                source_files.append(source_file)
+
+    for name in sorted(PLUGINS):
+        plugin = PLUGINS[name]
+        hasher.update(json.dumps([name, plugin["version"], \
+            plugin["cacheable"], [[lint_type, check.__name__] \
+            for lint_type, check in plugin["rules"]]]).encode())
+
+    for source_file in source_files:
+        with open(source_file, 'rb') as f:
+            hasher.update(hashlib.sha256(f.read()).digest())
+    return hasher.hexdigest()
+
+
+# files linted with a selection of the rules are keyed by its rule names
+def _cache_path(cache, data, rules=None):
+    import hashlib
+
+    hasher = hashlib.sha256(cache["fingerprint"].encode())
+    if rules is not None and rules is not ALL_CHECKS:
+        for lint_type in sorted(rules):
+            hasher.update(("%s:%s;" % (lint_type, ",".join([check.__name__ \
+                for check in rules[lint_type]]))).encode())
+    hasher.update(data)
+    key = hasher.hexdigest()
+    return os.path.join(cache["directory"], key[:2], key + ".json")
+
+
+# [rule, level, type, line, column, template, arguments], the type is the
+# name of a ViolationType, other types of plugins are stored by their value
+def _dump_violation(result):
+    violation_type = result.type
+    if isinstance(violation_type, ViolationType):
+        violation_type = violation_type.name
+    else:
+        violation_type = getattr(violation_type, "value", violation_type)
+    return [result.rule, result.level.value, violation_type, result.line, \
+        result.column, result.template, result.arguments]
+
+
+# Raises ValueError for an item that is not a violation of this version
+def _load_violation(item):
+    rule, level, violation_type, line, column, template, arguments = item
+    if isinstance(violation_type, str):
+        if violation_type not in ViolationType.__members__:
+            raise ValueError("Unknown violation type %s" % violation_type)
+        violation_type = ViolationType[violation_type]
+    if arguments is not None:
+        arguments = tuple(arguments)
+    return Violation(ViolationLevel(level), violation_type, line, column, \
+        sys.intern(template), arguments, sys.intern(rule))
+
+
+def _cache_load(cache_path):
+    import json
+
+    try:
+        with open(cache_path, 'r') as f:
+            items = json.load(f)
+        os.utime(cache_path)
+        # an entry that cannot be read back is a miss
+        return [_load_violation(item) for item in items]
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _cache_store(cache_path, results):
+    import json
+
+    items = [_dump_violation(result) for result in results]
+
+    # write aside and rename, workers may store the same entry together
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump(items, f)
+    os.replace(temp_path, cache_path)
+
+    # appends are atomic, so workers can count their entries in one file
+    writes_path = os.path.join(os.path.dirname(os.path.dirname(cache_path)), \
+        CACHE_WRITES)
+    fd = os.open(writes_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+    try:
+        os.write(fd, b".")
+    finally:
+        os.close(fd)
+
+
+def _prune_cache(directory, cache_size):
+    count_path = os.path.join(directory, CACHE_COUNT)
+    writes_path = os.path.join(directory, CACHE_WRITES)
+    try:
+        writes = os.path.getsize(writes_path)
+    except OSError:
+        # nothing was stored since the last prune
+        return
+    try:
+        with open(count_path, 'r') as f:
+            count = int(f.read())
+    except (OSError, ValueError):
+        count = None
+    if count is not None and count + writes <= cache_size:
+        return
+
+    # entries live in the subdirectories, the files at the top are kept
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        if root == directory:
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+
+    entries.sort()
+    for mtime, path in entries[:max(len(entries) - cache_size, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    try:
+        os.remove(writes_path)
+        temp_path = "%s.%d.tmp" % (count_path, os.getpid())
+        with open(temp_path, 'w') as f:
+            f.write(str(min(len(entries), cache_size)))
+        os.replace(temp_path, count_path)
+    except OSError:
+        pass
+
+
+# Profile
+#
+# With --profile-rules every check is wrapped to record its wall time, call
+# count and emitted violations. Without it the checks are called directly,
+# so profiling costs nothing when disabled.
+
+PROFILE_FILE_COUNT = 10
+
+
+def _new_profile():
+    return {"rules": {}, "files": {}}
+
+
+def _profile_check(check, lint_type, profile):
+    record = profile["rules"].setdefault("%s/%s" % (lint_type, check.__name__), {
+        "rule": check.__name__,
+        "phase": lint_type,
+        "seconds": 0.0,
+        "calls": 0,
+        "violations": 0})
+
+    # keeps __name__ and attributes like node_types
+    @functools.wraps(check)
+    def profiled_check(*args):
+        start_time = time.perf_counter()
+        result = check(*args)
+        if getattr(check, "batch", False) and result is not None \
+            and not isinstance(result, (Violation, tuple)):
+            # batch checks may be generators
+            result = list(result)
+        record["seconds"] += time.perf_counter() - start_time
+        record["calls"] += 1
+        if isinstance(result, list):
+            record["violations"] += len(result)
+        elif result is not None:
+            record["violations"] += 1
+        return result
+
+    return profiled_check
+
+
+def _profiled_rules(rules, profile):
+    profiled_rules = {}
+    for lint_type in rules:
+        profiled_rules[lint_type] = [_profile_check(check, lint_type, profile) \
+            for check in rules[lint_type]]
+    return profiled_rules
+
+
+def _merge_profile(profile, other_profile):
+    for key, other_record in other_profile["rules"].items():
+        record = profile["rules"].setdefault(key, dict(other_record, \
+            seconds=0.0, calls=0, violations=0))
+        for field in ("seconds", "calls", "violations"):
+            record[field] += other_record[field]
+    profile["files"].update(other_profile["files"])
+
+
+def _log_profile(profile):
+    records = sorted(profile["rules"].values(), \
+        key=lambda record: record["seconds"], reverse=True)
+    Log.info("%-40s %-14s %10s %10s %10s" % ("rule", "phase", "seconds", \
+        "calls", "violations"))
+    for record in records:
+        Log.info("%-40s %-14s %10.4f %10d %10d" % (record["rule"], \
+            record["phase"], record["seconds"], record["calls"], \
+            record["violations"]))
+
+    phase_seconds = {}
+    for record in records:
+        phase_seconds[record["phase"]] = \
+            phase_seconds.get(record["phase"], 0.0) + record["seconds"]
+    Log.info("")
+    Log.info("%-40s %10s" % ("phase", "seconds"))
+    for phase in sorted(phase_seconds, key=phase_seconds.get, reverse=True):
+        Log.info("%-40s %10.4f" % (phase, phase_seconds[phase]))
+
+    files = sorted(profile["files"], key=profile["files"].get, reverse=True)
+    Log.info("")
+    Log.info("%-40s %10s" % ("file (%d slowest of %d)" \
+        % (min(PROFILE_FILE_COUNT, len(files)), len(files)), "seconds"))
+    for lint_file in files[:PROFILE_FILE_COUNT]:
+        Log.info("%-40s %10.4f" % (lint_file, profile["files"][lint_file]))
+
+
+def _export_profile(profile, profile_path):
+    phase_seconds = {}
+    for record in profile["rules"].values():
+        phase_seconds[record["phase"]] = \
+            phase_seconds.get(record["phase"], 0.0) + record["seconds"]
+
+    import json
+
+    with open(profile_path, 'w') as f:
+        json.dump({
+            "rules": sorted(profile["rules"].values(), \
+                key=lambda record: record["seconds"], reverse=True),
+            "phases": phase_seconds,
+            "files": profile["files"]}, f, indent=2)
+
+
+# Yields at most max_violations of the results of one file as they are
+# found, the cache is only written once the whole file has been linted
+def _iter_file_violations(results, cache_path, max_violations):
+    stored_results = []
+    for result in itertools.islice(results, max_violations):
+        if cache_path is not None:
+            stored_results.append(result)
+        yield result
+
+    if cache_path is not None and (max_violations is None \
+        or len(stored_results) < max_violations):
+        _cache_store(cache_path, stored_results)
+
+
+# Returns (cacheable rules, rules of plugins that are not cacheable)
+def _split_cacheable_rules(rules):
+    cached_rules = {}
+    uncached_rules = {}
+    for lint_type, checks in rules.items():
+        cached_rules[lint_type] = []
+        for check in checks:
+            if getattr(check, "cacheable", True):
+                cached_rules[lint_type].append(check)
+            else:
+                uncached_rules.setdefault(lint_type, []).append(check)
+    return cached_rules, uncached_rules
+
+
+# Results of one file through its cache entry, `lint` returns the results
+# of the rules it is given. Only the results of cacheable rules are stored,
+# the other rules are linted every time.
+def _cached_violations(lint, rules, cache_path, max_violations):
+    cached_rules, uncached_rules = _split_cacheable_rules(rules)
+    results = _cache_load(cache_path)
+    if len(uncached_rules) == 0:
+        if results is not None:
+            return results[:max_violations]
+        return _iter_file_violations(lint(rules), cache_path, max_violations)
+
+    if results is None:
+        results = _iter_file_violations(lint(cached_rules), cache_path, None)
+    return itertools.islice(heapq.merge(results, lint(uncached_rules), \
+        key=_result_position), max_violations)
+
+
+# `data` is the raw content the cache entry is keyed by
+def _lint_code(code, data, cache=None, max_violations=None, rules=None):
+    if rules is None:
+        rules = ALL_CHECKS
+    if cache is None:
+        return _iter_file_violations(iter_violations(code, rules), None, \
+            max_violations)
+
+    return _cached_violations(functools.partial(iter_violations, code), \
+        rules, _cache_path(cache, data, rules), max_violations)
+
+
+# `changes` maps files to their changed line ranges, results of changed
+# lines only are not cached. `rules` are the rules of the file's pipeline.
+def _lint_file(lint_file, cache=None, max_violations=None, profile=None, \
+    changes=None, rules=None):
+    if rules is None:
+        rules = ALL_CHECKS
+    changed_lines = None
+    if changes is not None:
+        changed_lines = changes.get(lint_file, [])
+    is_large = changed_lines is None \
+        and os.path.getsize(lint_file) >= LARGE_FILE_SIZE
+    if is_large:
+        from dinodon_mmap import _lint_large_file
+
+    # profiled files are always linted and collected up front
+    if profile is not None:
+        start_time = time.perf_counter()
+        rules = _profiled_rules(rules, profile)
+        if is_large:
+            results = list(_lint_large_file(lint_file, None, max_violations, \
+                rules))
+        else:
+            results = list(_iter_file_violations(iter_violations( \
+                _read_source(lint_file), rules, changed_lines), None, \
+                max_violations))
+        profile["files"][lint_file] = time.perf_counter() - start_time
+        return lint_file, results
+
+    if is_large:
+        return lint_file, _lint_large_file(lint_file, cache, max_violations, \
+            rules)
+
+    if changed_lines is not None:
+        return lint_file, _iter_file_violations(iter_violations( \
+            _read_source(lint_file), rules, changed_lines), None, \
+            max_violations)
+
+    with open(lint_file, 'rb') as f:
+        data = f.read()
+    return lint_file, _lint_code(_decode_source(data), data, cache, \
+        max_violations, rules)
+
+
+# The message of an error raised while linting a file, for callers that
+# keep going without it
+def _lint_error_message(error):
+    return "%s: %s" % (error.__class__.__name__, error)
+
+
+def _lint_file_in_worker(lint_file, cache=None, max_violations=None, \
+    profile_rules=False, changes=None, selection=None, catch_errors=False):
+    profile = None
+    if profile_rules:
+        profile = _new_profile()
+    try:
+        lint_file, results = _lint_file(lint_file, cache, max_violations, \
+            profile, changes, _pipeline_rules(_compiled_pipeline(selection), \
+            lint_file))
+        return lint_file, list(results), profile
+    except Exception as error:
+        if not catch_errors:
+            raise
+        return lint_file, _lint_error_message(error), profile
+
+
+def _init_worker(plugin_options, registry_path=None):
+    for option in plugin_options:
+        _add_plugins(option, registry_path)
+
+
+# Yields (file, results) in the order of lint_files. Without a pool the
+# results of a file are streamed and have to be consumed before the next
+# file is linted. With catch_errors the results are a list, or the message
+# of the error that stopped linting the file.
+def _lint_files(lint_files, jobs, plugin_options, cache=None, \
+    max_violations=None, profile=None, changes=None, selection=None, \
+    catch_errors=False):
+    if jobs <= 1 or len(lint_files) <= 1:
+        pipeline = _compiled_pipeline(selection)
+        for lint_file in lint_files:
+            if not catch_errors:
+                yield _lint_file(lint_file, cache, max_violations, profile, \
+                    changes, _pipeline_rules(pipeline, lint_file))
+                continue
+            try:
+                yield lint_file, list(_lint_file(lint_file, cache, \
+                    max_violations, profile, changes, \
+                    _pipeline_rules(pipeline, lint_file))[1])
+            except Exception as error:
+                yield lint_file, _lint_error_message(error)
+        return
+
+    import multiprocessing
+
+    registry_path = None
+    if cache is not None:
+        registry_path = os.path.join(cache["directory"], PLUGIN_REGISTRY)
+    jobs = min(jobs, len(lint_files))
+    chunk_size = max(1, min(64, len(lint_files) // (jobs * 8)))
+    lint_function = functools.partial(_lint_file_in_worker, cache=cache, \
+        max_violations=max_violations, profile_rules=profile is not None, \
+        changes=changes, selection=selection, catch_errors=catch_errors)
+    with multiprocessing.Pool(jobs, _init_worker, (plugin_options, \
+        registry_path)) as pool:
+        for lint_file, results, file_profile in pool.imap(lint_function, \
+            lint_files, chunk_size):
+            if profile is not None:
+                _merge_profile(profile, file_profile)
+            yield lint_file, results
+
+
+# Run
+#
+# `run` lints the files in this process or a pool of workers. The report,
+# watch mode and large files live in their own modules, imported only when
+# they are used.
+
+# Returns False when the run found violations or could not start
+def _run(options, lint_paths):
+    report_path = None
+    jobs = 0
+    excludes = []
+    plugin_options = []
+    use_cache = True
+    clear_cache = False
+    cache_directory = CACHE_DIRECTORY
+    cache_size = CACHE_SIZE
+    max_violations = None
+    fail_fast = False
+    profile = None
+    profile_path = None
+    watch = False
+    watch_interval = None
+    diff_revision = None
+
+    for option in options:
+        if option.startswith("--plugins="):
+            plugin_options.append(option)
+        if option == "--report":
+            from dinodon_report import REPORT_PATH
+
+            report_path = REPORT_PATH
+        if option.startswith("--report="):
+            report_path = option.split("=", 1)[1]
+        if option.startswith("--jobs="):
+            jobs = int(option.split("=")[1])
+        if option.startswith("--exclude="):
+            excludes += option.split("=", 1)[1].split(",")
+        if option == "--no-cache":
+            use_cache = False
+        if option == "--clear-cache":
+            clear_cache = True
+        if option.startswith("--cache-dir="):
+            cache_directory = option.split("=", 1)[1]
+        if option.startswith("--cache-size="):
+            cache_size = int(option.split("=")[1])
+        if option.startswith("--max-violations="):
+            max_violations = int(option.split("=")[1])
+        if option == "--fail-fast":
+            fail_fast = True
+        if option.startswith("--profile-rules"):
+            profile = _new_profile()
+            # cached files would not call any rule
+            use_cache = False
+        if option.startswith("--profile-rules="):
+            profile_path = option.split("=", 1)[1]
+        if option == "--watch":
+            watch = True
+        if option.startswith("--interval="):
+            watch_interval = float(option.split("=")[1])
+        if option == "--diff":
+            diff_revision = "HEAD"
+        if option.startswith("--diff="):
+            diff_revision = option.split("=", 1)[1]
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+
+    # one violation is enough to know that a file is dirty
+    if fail_fast:
+        max_violations = 1
+
+    if clear_cache:
+        import shutil
+
+        shutil.rmtree(cache_directory, ignore_errors=True)
+
+    registry_path = None
+    if use_cache:
+        registry_path = os.path.join(cache_directory, PLUGIN_REGISTRY)
+    for option in plugin_options:
+        if not _add_plugins(option, registry_path):
+            return False
+
+    selection = _load_selection(options)
+    if selection is None:
+        return False
+
+    cache = None
+    if use_cache:
+        cache = {
+            "directory": cache_directory,
+            "fingerprint": _rules_fingerprint()}
+
+    changes = None
+    if diff_revision is not None:
+        changes = _git_changes(diff_revision, lint_paths or ["."])
+        if changes is None:
+            return False
+        # cache entries hold the results of whole files
+        cache = None
+
+    found_violations = False
+    if changes is not None:
+        lint_files = [lint_file for lint_file in sorted(changes) \
+            if lint_file.endswith(".py") \
+            and not _is_excluded(lint_file, excludes)]
+    else:
+        lint_files = _discover_files(lint_paths, excludes)
+    if watch:
+        from dinodon_watch import _watch, WATCH_INTERVAL
+
+        if watch_interval is None:
+            watch_interval = WATCH_INTERVAL
+        try:
+            _watch(lint_paths, excludes, jobs, plugin_options, cache, \
+                max_violations, report_path, watch_interval, selection)
+        except KeyboardInterrupt:
+            pass
+        if cache is not None:
+            _prune_cache(cache_directory, cache_size)
+    elif len(lint_files) == 0:
+        if changes is not None:
+            Log.info("No changed file to lint")
+        elif not clear_cache or len(lint_paths) > 0:
+            Log.error("No file to lint")
+    else:
+        show_file = len(lint_files) > 1
+        report = None
+        if report_path is not None:
+            from dinodon_report import _start_report, _add_report_file, \
+                _finish_report
+
+            report = _start_report(report_path)
+
+        for lint_file, total_results in _lint_files(lint_files, \
+            jobs, plugin_options, cache, max_violations, profile, \
+            changes, selection):
+            if report is not None:
+                total_results = list(total_results)
+                lines = []
+                if len(total_results) > 0:
+                    found_violations = True
+                    lines = _read_source(lint_file).split("\n")
+                _add_report_file(report, lint_file, total_results, lines)
+            else:
+                for result in total_results:
+                    found_violations = True
+                    _log_result(result, lint_file if show_file else None)
+
+            if fail_fast and found_violations:
+                break
+
+        if report is not None:
+            _finish_report(report)
+
+        if profile is not None:
+            _log_profile(profile)
+            if profile_path is not None:
+                _export_profile(profile, profile_path)
+        if cache is not None:
+            _prune_cache(cache_directory, cache_size)
+
+    return not found_violations
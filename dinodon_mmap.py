@@ -0,0 +1,171 @@
+# Large files
+#
+# Files of at least LARGE_FILE_SIZE bytes are memory-mapped instead of read.
+# Physical and logical checks run on lines decoded one at a time from the
+# mapping, only the lines of the logical line being checked are held. The
+# whole file is decoded for the ast phase alone, when it has live checks,
+# and released before the other phases start.
+
+import re
+import tokenize
+import heapq
+import functools
+import codecs
+
+from dinodon_engine import DIRECTIVE_REGEX, ALL_CHECKS, iter_violations, \
+    _new_source, _check_lines, _check_ast, _build_suppressions, \
+    _live_ast_checks, _result_position, _requires_tree, _has_batch_checks, \
+    _prefilter_rules, _can_match_mapped, _iter_file_violations, \
+    _cached_violations, _cache_path
+
+LARGE_FILE_CHUNK = 1024 * 1024
+DIRECTIVE_BYTES_REGEX = re.compile(DIRECTIVE_REGEX.pattern.encode(), re.M)
+LONE_CARRIAGE_RETURN_REGEX = re.compile(rb"\r(?!\n)")
+
+
+# The lines code.split("\n") would give, read through read_line as they are
+# indexed or tokenized. Lines before a released row are dropped.
+# dinodon:disable check_naming
+class LineStream:
+    __slots__ = ("read_line", "lines", "offset", "line_ended", "finished")
+
+    def __init__(self, read_line):
+        self.read_line = read_line
+        self.lines = []
+        self.offset = 0
+        self.line_ended = True
+        self.finished = False
+
+    def readline(self):
+        if self.finished:
+            return ""
+
+        line = self.read_line()
+        if line == "":
+            self.finished = True
+            # code ending with a newline has an empty last line
+            if self.line_ended:
+                self.lines.append("")
+            return line
+
+        self.line_ended = line.endswith("\n")
+        if self.line_ended:
+            self.lines.append(line[:-1])
+        else:
+            self.lines.append(line)
+        return line
+
+    def release(self, row):
+        count = min(row - 1 - self.offset, len(self.lines))
+        if count > 0:
+            del self.lines[:count]
+            self.offset += count
+
+    def __getitem__(self, index):
+        while index - self.offset >= len(self.lines) and not self.finished:
+            self.readline()
+        return self.lines[index - self.offset]
+
+    def __len__(self):
+        while not self.finished:
+            self.readline()
+        return self.offset + len(self.lines)
+# dinodon:enable check_naming
+
+
+def _mapped_encoding(mapped):
+    mapped.seek(0)
+    encoding = tokenize.detect_encoding(mapped.readline)[0]
+    mapped.seek(0)
+    return encoding
+
+
+def _decode_mapped(mapped, encoding):
+    code = str(mapped, encoding)
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+
+# Returns a readline over the mapping with its own position, so several
+# streams can read the same mapping
+def _mapped_readline(mapped, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    state = {"position": 0}
+
+    def read_line():
+        position = state["position"]
+        end = mapped.find(b"\n", position)
+        end = len(mapped) if end == -1 else end + 1
+        state["position"] = end
+
+        line = decoder.decode(mapped[position:end], end == position)
+        if line.endswith("\r\n"):
+            line = line[:-2] + "\n"
+        return line
+
+    return read_line
+
+
+def _count_newlines(mapped, start, end):
+    count = 0
+    for position in range(start, end, LARGE_FILE_CHUNK):
+        count += mapped[position:min(position + LARGE_FILE_CHUNK, end)] \
+            .count(b"\n")
+    return count
+
+
+def _mapped_directives(mapped, encoding):
+    directives = []
+    if mapped.find(b"# dinodon:") == -1:
+        return directives
+
+    line_number = 1
+    position = 0
+    for match_obj in DIRECTIVE_BYTES_REGEX.finditer(mapped):
+        line_number += _count_newlines(mapped, position, match_obj.start())
+        position = match_obj.start()
+        directives.append((line_number, match_obj.group(1).decode(), \
+            match_obj.group(2).decode(encoding).split()))
+    return directives
+
+
+# iter_violations of a mapped file, the mapping has to stay open until the
+# results are consumed
+def _iter_mapped_violations(mapped, rules):
+    encoding = _mapped_encoding(mapped)
+    rules = _prefilter_rules(rules, functools.partial(_can_match_mapped, \
+        mapped=mapped, encoding=encoding))
+    # old Mac newlines, logical checks using the tree and batch checks need
+    # the whole code
+    if LONE_CARRIAGE_RETURN_REGEX.search(mapped) is not None \
+        or _requires_tree(rules.get("logical_line", [])) \
+        or _has_batch_checks(rules):
+        return iter_violations(_decode_mapped(mapped, encoding), rules)
+
+    suppressions = _build_suppressions(_mapped_directives(mapped, encoding))
+    ast_results = []
+    if len(_live_ast_checks(rules.get("ast", []), suppressions, \
+        LineStream(_mapped_readline(mapped, encoding)))):
+        ast_results = list(_check_ast(_new_source(_decode_mapped(mapped, \
+            encoding)), rules, suppressions))
+
+    source = _new_source(None, LineStream(_mapped_readline(mapped, encoding)))
+    return heapq.merge(_check_lines(source, rules, suppressions), \
+        ast_results, key=_result_position)
+
+
+def _lint_large_file(lint_file, cache=None, max_violations=None, \
+    rules=None):
+    import mmap
+
+    if rules is None:
+        rules = ALL_CHECKS
+    with open(lint_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if cache is None:
+                yield from _iter_file_violations(_iter_mapped_violations( \
+                    mapped, rules), None, max_violations)
+                return
+
+            yield from _cached_violations(functools.partial( \
+                _iter_mapped_violations, mapped), rules, \
+                _cache_path(cache, mapped, rules), max_violations)
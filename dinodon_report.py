@@ -0,0 +1,161 @@
+# Report
+#
+# The results are written to shards while files finish, next to report.js
+# in `<name>_shards/`. Every shard holds at most REPORT_SHARD_SIZE results
+# of one file with their snippets, report.html only loads the shards of the
+# rows scrolled into view:
+#
+#   dinodonShard(0, {"snippets": [{"start_line": 1, "code_around": [...]}],
+#       "results": [{"snippet": 0, "line_number": 2, ...}]})
+#
+# report.js is written last and only holds an index with the statistics:
+#
+#   var report = {"files": ["a.py"], "file_count": 12,
+#       "shard_directory": "report_shards", "shards": [[file, count]],
+#       "overall": {"warnings": 1, "errors": 2},
+#       "statistics": [{"type": 6, "level": 1, "count": 2, ...}]}
+#
+# Only the file being written is held in memory, and violations sharing the
+# same lines within a shard share one snippet.
+
+import os
+
+from dinodon_engine import ViolationLevel
+
+REPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "report", "report.js")
+REPORT_SHARD_SIZE = 500
+
+
+def _start_report(report_path):
+    import shutil
+
+    shard_directory = os.path.splitext(report_path)[0] + "_shards"
+    report = {
+        "path": report_path,
+        "temp_path": report_path + ".tmp",
+        "shard_directory": shard_directory,
+        "temp_directory": shard_directory + ".tmp",
+        "files": [],
+        "file_count": 0,
+        "shards": [],
+        "overall": {"warnings": 0, "errors": 0},
+        "statistics": {}}
+    shutil.rmtree(report["temp_directory"], ignore_errors=True)
+    os.makedirs(report["temp_directory"])
+    return report
+
+
+def _write_report_shard(report, file_index, snippets, results):
+    import json
+
+    shard_snippets = []
+    shard_results = []
+    snippet_indexes = {}
+    for result in results:
+        snippet_index = snippet_indexes.get(result["snippet"])
+        if snippet_index is None:
+            snippet_index = len(shard_snippets)
+            snippet_indexes[result["snippet"]] = snippet_index
+            shard_snippets.append(snippets[result["snippet"]])
+        shard_results.append(dict(result, snippet=snippet_index))
+
+    shard_index = len(report["shards"])
+    report["shards"].append([file_index, len(results)])
+    with open(os.path.join(report["temp_directory"], "%d.js" \
+        % shard_index), 'w') as f:
+        f.write("dinodonShard(%d, %s)\n" % (shard_index, json.dumps({
+            "snippets": shard_snippets,
+            "results": shard_results})))
+
+
+def _count_report_result(report, result):
+    if result["level"] == ViolationLevel.WARNING.value:
+        report["overall"]["warnings"] += 1
+    else:
+        report["overall"]["errors"] += 1
+
+    statistic = report["statistics"].get(result["type"])
+    if statistic is None:
+        report["statistics"][result["type"]] = {
+            "type": result["type"],
+            "level": result["level"],
+            "count": 1,
+            "description": result["description"]}
+    else:
+        statistic["count"] += 1
+
+
+# The entries of one file, snippets are numbered within the file until it
+# is written. Watch mode keeps them to rewrite the report without reading
+# unchanged files again.
+def _report_file_entry(lint_file, results, lines):
+    snippets = {}
+    snippet_entries = []
+    result_entries = []
+    for result in results:
+        line_number = result.line
+        # error line and two lines before/after it
+        start_line = max(1, line_number - 2)
+        end_line = min(len(lines), line_number + 2)
+
+        snippet = snippets.get((start_line, end_line))
+        if snippet is None:
+            snippet = len(snippets)
+            snippets[(start_line, end_line)] = snippet
+            snippet_entries.append({
+                "start_line": start_line,
+                "code_around": lines[start_line - 1:end_line]})
+
+        result_entries.append({
+            "snippet": snippet,
+            "rule": result.rule,
+            "level": result.level.value,
+            "type": getattr(result.type, "value", result.type),
+            "line_number": line_number,
+            "column_offset": result.column,
+            "description": result.description})
+
+    return {
+        "file": lint_file,
+        "snippets": snippet_entries,
+        "results": result_entries}
+
+
+# files without results are only counted
+def _write_report_file(report, entry):
+    report["file_count"] += 1
+    results = entry["results"]
+    if len(results) == 0:
+        return
+
+    file_index = len(report["files"])
+    report["files"].append(entry["file"])
+    for start in range(0, len(results), REPORT_SHARD_SIZE):
+        _write_report_shard(report, file_index, entry["snippets"], \
+            results[start:start + REPORT_SHARD_SIZE])
+    for result in results:
+        _count_report_result(report, result)
+
+
+def _add_report_file(report, lint_file, results, lines):
+    _write_report_file(report, _report_file_entry(lint_file, results, lines))
+
+
+def _finish_report(report):
+    import json
+    import shutil
+
+    with open(report["temp_path"], 'w') as f:
+        f.write("var report = %s\n" % json.dumps({
+            "files": report["files"],
+            "file_count": report["file_count"],
+            "shard_directory": os.path.basename(report["shard_directory"]),
+            "shards": report["shards"],
+            "overall": report["overall"],
+            "statistics": sorted(report["statistics"].values(), \
+                key=lambda statistic: statistic["type"])}))
+
+    shutil.rmtree(report["shard_directory"], ignore_errors=True)
+    os.replace(report["temp_directory"], report["shard_directory"])
+    os.replace(report["temp_path"], report["path"])
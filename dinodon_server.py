@@ -0,0 +1,314 @@
+# Server
+#
+# `serve` keeps the rules, plugins and cache fingerprint loaded and answers
+# lint requests on a unix socket, one JSON object per line each way:
+#
+#   request:  {"path": file, "code": buffer or null, "max_violations": N,
+#              "selection": selection, "plugins": [plugin], "root": dir}
+#   response: {"path": file, "results": [violation]} or
+#             {"path": file, "error": message}
+#
+# Requests with a path that is not a string, code that is neither null nor
+# a string, or an error raised by a rule get an error response.
+#
+# The selection, plugins and root are optional. A selection replaces the
+# one of the server and its override paths are matched relative to root.
+# When the plugins differ from those of the server, the request is refused
+# with "refused": true and `check` lints in process instead.
+#
+# A violation is the list stored in cache entries. Without "code" the server
+# reads the file itself. `check` sends its files to a running server and
+# lints them in process when there is none.
+
+import sys
+import os
+
+from dinodon_engine import Log, PLUGIN_REGISTRY, CACHE_DIRECTORY, \
+    CACHE_SIZE, _log_result, _add_plugins, _load_selection, \
+    _selection_error, _compiled_pipeline, _pipeline_rules, \
+    _rules_fingerprint, _prune_cache, _decode_source, _discover_files, \
+    _lint_code, _load_violation, _dump_violation
+
+SOCKET_PATH = ".dinodon.sock"
+SOCKET_TIMEOUT = 10.0
+
+
+# Plugin files by absolute path, so the client and the server compare them
+# from any directory
+def _plugin_values(plugin_options):
+    values = []
+    for option in plugin_options:
+        value = option.split("=", 1)[1]
+        if value.endswith(".py") or os.path.isfile(value):
+            value = os.path.abspath(value)
+        values.append(value)
+    return sorted(values)
+
+
+# `plugins` are the plugin values of the server, not checked when None
+def _serve_request(request, cache, pipeline=None, plugins=None):
+    path = request.get("path")
+    code = request.get("code")
+    max_violations = request.get("max_violations")
+    # an int path would be opened as a file descriptor of the server
+    if not isinstance(path, str):
+        return {"path": None, "error": "Invalid path"}
+    if code is not None and not isinstance(code, str):
+        return {"path": path, "error": "Invalid code"}
+    if max_violations is not None and (not isinstance(max_violations, int) \
+        or isinstance(max_violations, bool)):
+        return {"path": path, "error": "Invalid max_violations"}
+
+    if plugins is not None and "plugins" in request \
+        and request["plugins"] != plugins:
+        return {
+            "path": path,
+            "error": "The server runs other plugins",
+            "refused": True}
+    root = request.get("root")
+    if root is not None and not isinstance(root, str):
+        return {"path": path, "error": "Invalid root"}
+    if request.get("selection") is not None:
+        error = _selection_error(request["selection"])
+        if error is not None:
+            return {"path": path, "error": error}
+        pipeline = _compiled_pipeline(request["selection"])
+
+    rules = None
+    try:
+        if pipeline is not None:
+            rules = _pipeline_rules(pipeline, path, root)
+        if code is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            code = _decode_source(data)
+        else:
+            data = code.encode("utf-8")
+        results = _lint_code(code, data, cache, max_violations, rules)
+        return {
+            "path": path,
+            "results": [_dump_violation(result) for result in results]}
+    except (OSError, ValueError, TypeError, SyntaxError) as error:
+        return {"path": path, "error": str(error)}
+    except Exception as error:
+        # a failing plugin only fails the request it was called for
+        return {"path": path, "error": "%s: %s" \
+            % (error.__class__.__name__, error)}
+
+
+def _connect_server(socket_path):
+    import socket
+
+    if getattr(socket, "AF_UNIX", None) is None:
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(SOCKET_TIMEOUT)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    return client
+
+
+# Returns the responses, or None when the server went away on the way
+def _request_server(client, requests):
+    import json
+
+    stream = client.makefile('rwb')
+    responses = []
+    try:
+        for request in requests:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                return None
+            responses.append(json.loads(line))
+    except (OSError, ValueError):
+        return None
+    finally:
+        stream.close()
+        client.close()
+    return responses
+
+
+def _serve(options):
+    import json
+    import socketserver
+
+    socket_path = SOCKET_PATH
+    cache_directory = CACHE_DIRECTORY
+    cache_size = CACHE_SIZE
+    use_cache = True
+
+    plugin_options = []
+
+    for option in options:
+        if option.startswith("--plugins="):
+            plugin_options.append(option)
+        if option.startswith("--socket="):
+            socket_path = option.split("=", 1)[1]
+        if option == "--no-cache":
+            use_cache = False
+        if option.startswith("--cache-dir="):
+            cache_directory = option.split("=", 1)[1]
+        if option.startswith("--cache-size="):
+            cache_size = int(option.split("=")[1])
+
+    registry_path = None
+    if use_cache:
+        registry_path = os.path.join(cache_directory, PLUGIN_REGISTRY)
+    for option in plugin_options:
+        if not _add_plugins(option, registry_path):
+            return False
+
+    if os.path.exists(socket_path):
+        client = _connect_server(socket_path)
+        if client is not None:
+            client.close()
+            Log.error("A server is already listening on %s" % socket_path)
+            return False
+        # left behind by a server that did not shut down
+        os.unlink(socket_path)
+
+    selection = _load_selection(options)
+    if selection is None:
+        return False
+    pipeline = _compiled_pipeline(selection)
+    plugins = _plugin_values(plugin_options)
+
+    cache = None
+    if use_cache:
+        cache = {
+            "directory": cache_directory,
+            "fingerprint": _rules_fingerprint()}
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict):
+                    response = _serve_request(request, cache, pipeline, \
+                        plugins)
+                else:
+                    response = {"path": None, "error": "Invalid request"}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+
+    # lint_source is reentrant, each connection gets its own thread
+    server = socketserver.ThreadingUnixStreamServer(socket_path, \
+        RequestHandler)
+    server.daemon_threads = True
+    Log.info("Serving on %s" % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+        if cache is not None:
+            _prune_cache(cache_directory, cache_size)
+    return True
+
+
+def _check(options, lint_paths):
+    socket_path = SOCKET_PATH
+    plugin_options = []
+    max_violations = None
+    read_stdin = False
+    cache_directory = CACHE_DIRECTORY
+    cache_size = CACHE_SIZE
+    use_cache = True
+
+    for option in options:
+        if option.startswith("--plugins="):
+            plugin_options.append(option)
+        if option.startswith("--socket="):
+            socket_path = option.split("=", 1)[1]
+        if option == "--no-cache":
+            use_cache = False
+        if option.startswith("--cache-dir="):
+            cache_directory = option.split("=", 1)[1]
+        if option.startswith("--cache-size="):
+            cache_size = int(option.split("=")[1])
+        if option.startswith("--max-violations="):
+            max_violations = int(option.split("=")[1])
+        if option == "--stdin":
+            read_stdin = True
+
+    # the rules of plugins are only known to whoever loads them
+    selection = _load_selection(options, check_names=False)
+    if selection is None:
+        return False
+
+    # the buffer of an editor is linted under the name of its file
+    requests = []
+    if read_stdin:
+        lint_files = (lint_paths + ["<stdin>"])[:1]
+        codes = [_decode_source(sys.stdin.buffer.read())]
+    else:
+        lint_files = _discover_files(lint_paths, [])
+        codes = [None] * len(lint_files)
+    for lint_file, code in zip(lint_files, codes):
+        requests.append({
+            "path": os.path.abspath(lint_file),
+            "code": code,
+            "max_violations": max_violations,
+            "selection": selection,
+            "plugins": _plugin_values(plugin_options),
+            "root": os.getcwd()})
+
+    if len(lint_files) == 0:
+        Log.error("No file to lint")
+        return True
+
+    responses = None
+    client = _connect_server(socket_path)
+    if client is not None:
+        responses = _request_server(client, requests)
+    if responses is not None and any([response.get("refused", False) \
+        for response in responses]):
+        Log.warning("The server on %s runs other plugins, linting in " \
+            "process" % socket_path)
+        responses = None
+
+    # the options of the cache only apply when there is no server
+    if responses is None:
+        registry_path = None
+        if use_cache:
+            registry_path = os.path.join(cache_directory, PLUGIN_REGISTRY)
+        for option in plugin_options:
+            if not _add_plugins(option, registry_path):
+                return False
+        selection = _load_selection(options)
+        if selection is None:
+            return False
+        pipeline = _compiled_pipeline(selection)
+        cache = None
+        if use_cache:
+            cache = {
+                "directory": cache_directory,
+                "fingerprint": _rules_fingerprint()}
+        responses = [_serve_request(request, cache, pipeline) \
+            for request in requests]
+        if cache is not None:
+            _prune_cache(cache_directory, cache_size)
+
+    found_violations = False
+    show_file = len(lint_files) > 1
+    for lint_file, response in zip(lint_files, responses):
+        if "error" in response:
+            found_violations = True
+            Log.error("%s: %s" % (lint_file, response["error"]))
+            continue
+        for item in response["results"]:
+            found_violations = True
+            _log_result(_load_violation(item), \
+                lint_file if show_file else None)
+    return not found_violations
@@ -0,0 +1,91 @@
+# Watch
+#
+# `run --watch` lints everything once, then polls the paths for files whose
+# mtime or size changed, or that were added or removed. Only those files are
+# linted again, the results of the others stay in memory.
+
+import os
+import time
+
+from dinodon_engine import Log, _log_result, _discover_files, _read_source, \
+    _lint_files, _lint_error_message
+from dinodon_report import _start_report, _report_file_entry, \
+    _write_report_file, _finish_report
+
+WATCH_INTERVAL = 1.0
+
+
+def _file_signature(lint_file):
+    try:
+        stat = os.stat(lint_file)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _watch(lint_paths, excludes, jobs, plugin_options, cache=None, \
+    max_violations=None, report_path=None, interval=WATCH_INTERVAL, \
+    selection=None):
+    signatures = {}
+    violation_counts = {}
+    report_entries = {}
+
+    while True:
+        lint_files = []
+        changed_files = []
+        file_signatures = {}
+        for lint_file in _discover_files(lint_paths, excludes):
+            signature = _file_signature(lint_file)
+            if signature is None:
+                continue
+            lint_files.append(lint_file)
+            file_signatures[lint_file] = signature
+            if signatures.get(lint_file) != signature:
+                changed_files.append(lint_file)
+
+        removed_files = [lint_file for lint_file in signatures \
+            if lint_file not in file_signatures]
+        signatures = file_signatures
+        for lint_file in removed_files:
+            violation_counts.pop(lint_file, None)
+            report_entries.pop(lint_file, None)
+
+        if len(changed_files) > 0 or len(removed_files) > 0:
+            # a file that cannot be linted keeps its previous results until
+            # it changes again
+            for lint_file, results in _lint_files(changed_files, jobs, \
+                plugin_options, cache, max_violations, selection=selection, \
+                catch_errors=True):
+                if report_path is not None and not isinstance(results, str):
+                    try:
+                        lines = []
+                        if len(results) > 0:
+                            lines = _read_source(lint_file).split("\n")
+                        report_entries[lint_file] = _report_file_entry( \
+                            lint_file, results, lines)
+                    except Exception as error:
+                        results = _lint_error_message(error)
+                if isinstance(results, str):
+                    Log.error("%s: %s" % (lint_file, results))
+                    continue
+
+                violation_counts[lint_file] = len(results)
+                for result in results:
+                    _log_result(result, lint_file)
+
+            if report_path is not None:
+                try:
+                    report = _start_report(report_path)
+                    for lint_file in lint_files:
+                        if lint_file in report_entries:
+                            _write_report_file(report, \
+                                report_entries[lint_file])
+                    _finish_report(report)
+                except OSError as error:
+                    Log.error("Cannot write the report: %s" % error)
+
+            Log.info("Linted %d of %d files, %d violations in total" \
+                % (len(changed_files), len(lint_files), \
+                sum(violation_counts.values())))
+
+        time.sleep(interval)
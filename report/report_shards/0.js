@@ -0,0 +1 @@
+dinodonShard(0, {"snippets": [{"start_line": 1, "code_around": ["import re, ast", "from enum import Enum", ""]}, {"start_line": 198, "code_around": ["    # Test case:", "    # a = map(lambda x: x * x, b)", "    ", "    b = [1, 2, 3,4]", "    a = a = map(lambda x: x * x, b)"]}, {"start_line": 200, "code_around": ["    ", "    b = [1, 2, 3,4]", "    a = a = map(lambda x: x * x, b)", "", "    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \\"]}, {"start_line": 399, "code_around": ["            ALL_CHECKS[lint_type].append(check)", "", "def _generate_report(results, code):", "    report = []", "    code_by_line = code.split(\"\\n\")"]}, {"start_line": 473, "code_around": ["                for lint_file in lint_files:", "                    with open(lint_file, 'r') as f:", "                        Code = f.read()", "", "                        total_results = _check_code(Code)"]}], "results": [{"snippet": 0, "rule": "check_multiple_import", "level": 1, "type": 6, "line_number": 1, "column_offset": 0, "description": "Multiple import in one line"}, {"snippet": 1, "rule": "check_trailing_whitespace", "level": 1, "type": 2, "line_number": 200, "column_offset": 0, "description": "Blank line contains whitespace"}, {"snippet": 2, "rule": "check_lambda_in_high_order_function", "level": 0, "type": 11, "line_number": 202, "column_offset": 12, "description": "Use lambda in high order function"}, {"snippet": 3, "rule": "check_correct_blank_lines", "level": 1, "type": 8, "line_number": 401, "column_offset": 0, "description": "Expected 2 blank lines, found 1"}, {"snippet": 4, "rule": "check_naming", "level": 0, "type": 10, "line_number": 475, "column_offset": 24, "description": "Wrong format naming"}]})
@@ -0,0 +1,82 @@
+from dinodon_engine import _decode_source
+
+# Fixed inputs the fast paths are compared with lint_source on, as the bytes
+# of a file
+
+PLAIN = b"""import os, sys
+
+
+class bad_class:
+    def Method(self):
+        return map(lambda x: x, [1])
+
+def function_with_a_rather_long_name(first_argument, second_argument, third):
+    values = [first_argument,\tsecond_argument]
+    return values \x20
+
+
+VALUE = {"key": "a string that makes this line longer than eighty columns", \
+    "other": 1}
+"""
+
+SYNTAX_ERROR = b"""import os, sys
+
+def broken(:
+    value = 1\x20
+\tother = 2
+
+
+def fine(value):
+    return value
+"""
+
+DIRECTIVES = b"""import os, sys
+# dinodon:disable check_multiple_import check_trailing_whitespace
+import re, json\x20
+value = 1\t
+# dinodon:enable check_multiple_import
+import io, ast \x20
+
+
+class lower_name:
+    pass
+"""
+
+DECORATORS = b"""import functools
+
+
+@functools.lru_cache()
+
+def Cached(value):
+    return value
+
+
+@property
+def Other(value):
+    return map(lambda x: x, value)
+
+
+class Holder:
+    @staticmethod
+
+    def Build():
+        return 1
+"""
+
+FILES = {
+    "plain": PLAIN,
+    "crlf": PLAIN.replace(b"\n", b"\r\n"),
+    "bom": b"\xef\xbb\xbf" + PLAIN,
+    "syntax_error": SYNTAX_ERROR,
+    "directives": DIRECTIVES,
+    "decorators": DECORATORS}
+
+# The code of the files as run reads them, and a buffer with "\r\n" as an
+# editor may pass it
+SOURCES = dict([(name, _decode_source(data)) for name, data in FILES.items()])
+SOURCES["crlf_buffer"] = PLAIN.replace(b"\n", b"\r\n").decode()
+
+
+def positions(results):
+    return [(result.line, result.column, result.rule, result.type, \
+        result.level) for result in results]
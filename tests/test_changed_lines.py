@@ -0,0 +1,30 @@
+import pytest
+
+from dinodon_engine import lint_source, iter_violations
+from sources import SOURCES, positions
+
+# Linting only some lines has to give the results of a full lint on them
+
+
+def _ranges(line_count):
+    for first in range(1, line_count + 1):
+        for last in range(first, min(first + 3, line_count) + 1):
+            yield [(first, last)]
+    yield [(1, 2), (5, 6), (9, line_count)]
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+def test_changed_lines_match_filtered_full_lint(name):
+    code = SOURCES[name]
+    results = lint_source(code)
+    for changed_lines in _ranges(len(code.split("\n"))):
+        expected_results = [result for result in results \
+            if any(first <= result.line <= last \
+            for first, last in changed_lines)]
+        assert positions(iter_violations(code, changed_lines=changed_lines)) \
+            == positions(expected_results), changed_lines
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+def test_no_changed_lines(name):
+    assert list(iter_violations(SOURCES[name], changed_lines=[])) == []
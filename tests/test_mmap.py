@@ -0,0 +1,61 @@
+import mmap
+
+import pytest
+
+from dinodon_engine import ALL_CHECKS, lint_source, _read_source, \
+    _rules_fingerprint
+from dinodon_mmap import LONE_CARRIAGE_RETURN_REGEX, LineStream, \
+    _mapped_encoding, _mapped_readline, _lint_large_file
+from sources import FILES, PLAIN, positions
+
+# Mapped files are read line by line from their bytes, they have to give the
+# lines and results of the code _read_source decodes
+
+MAPPED_FILES = dict(FILES)
+MAPPED_FILES["old_mac"] = PLAIN.replace(b"\n", b"\r")
+MAPPED_FILES["latin_1"] = b"# -*- coding: latin-1 -*-\nname = '\xe9' \n"
+
+LINE_RULES = {
+    "physical_line": ALL_CHECKS["physical_line"],
+    "logical_line": ALL_CHECKS["logical_line"]}
+
+
+@pytest.fixture(params=sorted(MAPPED_FILES))
+def lint_file(request, tmp_path):
+    path = tmp_path / ("%s.py" % request.param)
+    path.write_bytes(MAPPED_FILES[request.param])
+    return str(path)
+
+
+def test_line_stream_matches_read_source(lint_file):
+    lines = _read_source(lint_file).split("\n")
+    with open(lint_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # files with lone carriage returns are decoded as a whole
+            if LONE_CARRIAGE_RETURN_REGEX.search(mapped) is not None:
+                return
+            encoding = _mapped_encoding(mapped)
+            assert len(LineStream(_mapped_readline(mapped, encoding))) \
+                == len(lines)
+
+            stream = LineStream(_mapped_readline(mapped, encoding))
+            for row in range(1, len(lines) + 1):
+                assert stream[row - 1] == lines[row - 1]
+                stream.release(row)
+            assert len(stream) == len(lines)
+
+
+@pytest.mark.parametrize("rules", [None, LINE_RULES], \
+    ids=["all", "lines"])
+def test_large_file_matches_lint_source(lint_file, rules):
+    assert positions(_lint_large_file(lint_file, rules=rules)) \
+        == positions(lint_source(_read_source(lint_file), rules))
+
+
+def test_cached_large_file_matches_lint_source(lint_file, tmp_path):
+    cache = {
+        "directory": str(tmp_path / "cache"),
+        "fingerprint": _rules_fingerprint()}
+    results = positions(lint_source(_read_source(lint_file)))
+    assert positions(_lint_large_file(lint_file, cache)) == results
+    assert positions(_lint_large_file(lint_file, cache)) == results
@@ -0,0 +1,45 @@
+import pytest
+
+from dinodon_engine import ALL_CHECKS, lint_source, iter_violations
+from sources import SOURCES, positions
+
+# Physical checks with a regex are only called on the lines it matches, they
+# have to report what they report when called on every line
+
+
+def _per_line(check):
+    def per_line_check(*args, **kwargs):
+        return check(*args, **kwargs)
+
+    per_line_check.__dict__.update(check.__dict__)
+    del per_line_check.regex
+    per_line_check.__name__ = check.__name__
+    return per_line_check
+
+
+PER_LINE_CHECKS = dict(ALL_CHECKS)
+PER_LINE_CHECKS["physical_line"] = [_per_line(check) \
+    if hasattr(check, "regex") else check \
+    for check in ALL_CHECKS["physical_line"]]
+
+
+def test_core_checks_have_regexes():
+    assert any(hasattr(check, "regex") \
+        for check in ALL_CHECKS["physical_line"])
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+def test_regex_rows_match_per_line_calls(name):
+    code = SOURCES[name]
+    assert positions(lint_source(code)) \
+        == positions(lint_source(code, PER_LINE_CHECKS))
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+def test_regex_rows_match_per_line_calls_on_changed_lines(name):
+    code = SOURCES[name]
+    for line_number in range(1, len(code.split("\n")) + 1):
+        changed_lines = [(line_number, line_number + 1)]
+        assert positions(iter_violations(code, changed_lines=changed_lines)) \
+            == positions(iter_violations(code, PER_LINE_CHECKS, \
+            changed_lines)), changed_lines
@@ -0,0 +1,46 @@
+import pytest
+
+from dinodon_engine import lint_source, lint_snapshot, relint_region
+from sources import SOURCES, positions
+
+# Every line of the inputs is changed, followed by an inserted line and
+# removed in turn, relint_region has to return what a full lint returns
+
+
+def _edits(code):
+    lines = code.split("\n")
+    newline = "\r" if "\r\n" in code else ""
+    for index in range(len(lines)):
+        line_number = index + 1
+        changed = list(lines)
+        changed[index] = changed[index] + "\t "
+        yield "\n".join(changed), line_number, line_number, 0
+
+        changed = list(lines)
+        changed.insert(index + 1, "import a, b" + newline)
+        yield "\n".join(changed), line_number + 1, line_number + 1, 1
+
+        if len(lines) > 1:
+            changed = list(lines)
+            del changed[index]
+            changed_line = min(line_number, len(changed))
+            yield "\n".join(changed), changed_line, changed_line, -1
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+def test_snapshot_matches_full_lint(name):
+    code = SOURCES[name]
+    assert positions(lint_snapshot(code)["results"]) \
+        == positions(lint_source(code))
+
+
+@pytest.mark.parametrize("name", sorted(SOURCES))
+def test_relint_region_matches_full_lint(name):
+    code = SOURCES[name]
+    snapshot = lint_snapshot(code)
+    for new_code, start_line, end_line, line_delta in _edits(code):
+        new_snapshot = relint_region(snapshot, new_code, start_line, \
+            end_line, line_delta)
+        assert positions(new_snapshot["results"]) \
+            == positions(lint_source(new_code)), \
+            (start_line, end_line, line_delta)